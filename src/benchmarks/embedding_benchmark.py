@@ -0,0 +1,59 @@
+"""Embedding benchmark: chunks/sec of the bulk embedding modes on the bundled paper.
+
+Run from anywhere:  python src/benchmarks/embedding_benchmark.py [--processes N]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+SRC_DIR = Path(__file__).parent.parent.resolve()
+sys.path.append(str(SRC_DIR))
+
+import config
+from models.embeddings import EmbeddingHandler
+from rag.document_processor import DocumentProcessor
+
+PDF_PATH = config.UPLOADS_DIR / "NIPS-2017-attention-is-all-you-need-Paper.pdf"
+
+def cosine_agreement(a, b):
+    """Mean cosine similarity between matching rows, after undoing any quantization scale"""
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    chunks = DocumentProcessor().process_pdf(str(PDF_PATH))
+    handler = EmbeddingHandler()
+    handler.get_embeddings(["warm-up"])
+
+    modes = [
+        ("baseline (encode, batch 32)", None),
+        ("bulk, batch 64, unsorted", dict(batch_size=64, sort_by_length=False, processes=1)),
+        ("bulk, batch 64, sorted", dict(batch_size=64, sort_by_length=True, processes=1)),
+        (f"bulk, {args.processes} processes", dict(batch_size=64, sort_by_length=True, processes=args.processes)),
+        ("bulk, float16", dict(batch_size=64, processes=1, precision="float16")),
+        ("bulk, int8", dict(batch_size=64, processes=1, precision="int8")),
+    ]
+
+    reference = None
+    print(f"{len(chunks)} chunks from {PDF_PATH.name}")
+    print(f"{'mode':32s} {'chunks/s':>10s} {'bytes':>10s} {'cosine':>8s}")
+    for name, kwargs in modes:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            if kwargs is None: embeddings = np.asarray(handler.get_embeddings(chunks), dtype=np.float32)
+            else: embeddings = handler.encode_bulk(chunks, **kwargs)
+            best = min(best, time.perf_counter() - start)
+        if reference is None: reference = embeddings
+        print(f"{name:32s} {len(chunks) / best:10.1f} {embeddings.nbytes:10d} {cosine_agreement(reference, embeddings):8.4f}")
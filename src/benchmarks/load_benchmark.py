@@ -0,0 +1,76 @@
+"""Load benchmark: concurrent simulated users chatting through the scheduler on the mock backend.
+
+Needs no model or GPU. Run from anywhere:  python src/benchmarks/load_benchmark.py --users 8 --turns 3
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent.resolve()
+sys.path.append(str(SRC_DIR))
+
+import config
+from models.llm_handler import LLMHandler
+from models.scheduler import InferenceScheduler, SchedulerFullError, RequestTimeoutError
+
+QUESTIONS = [
+    "What problem does the attention mechanism solve?",
+    "How is multi-head attention different from single-head attention?",
+    "Why are positional encodings needed?",
+    "Summarize the training setup in two sentences.",
+]
+
+def simulate_user(scheduler, handler, user_id, turns, results):
+    history = []
+    for turn in range(turns):
+        history.append({'role': 'user', 'content': QUESTIONS[(user_id + turn) % len(QUESTIONS)]})
+        start = time.perf_counter()
+        first = None
+        try:
+            pieces = []
+            for piece in scheduler.stream(handler.stream_response, list(history), chat_id=f"load-{user_id}", user_id=user_id):
+                if first is None: first = time.perf_counter()
+                pieces.append(piece)
+        except (SchedulerFullError, RequestTimeoutError) as e:
+            results.append(("rejected", type(e).__name__, 0))
+            history.pop()
+            continue
+        history.append({'role': 'assistant', 'content': "".join(pieces)})
+        results.append(("ok", first - start, time.perf_counter() - start))
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--backend", default="mock")
+    args = parser.parse_args()
+
+    config.LLM_BACKEND = args.backend
+    handler = LLMHandler(use_pool=False)
+    handler.load_model()
+    scheduler = InferenceScheduler()
+
+    results = []
+    threads = [
+        threading.Thread(target=simulate_user, args=(scheduler, handler, u, args.turns, results))
+        for u in range(args.users)
+    ]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r[0] == "ok"]
+    ttft = [r[1] for r in ok]
+    latency = [r[2] for r in ok]
+    print(f"Backend: {args.backend}   users: {args.users}   turns: {args.turns}")
+    print(f"Completed: {len(ok)}   rejected: {len(results) - len(ok)}   wall time: {elapsed:.2f} s")
+    print(f"Throughput: {len(ok) / elapsed:.2f} responses/s")
+    print(f"TTFT     p50 {percentile(ttft, 0.5):.2f} s   p95 {percentile(ttft, 0.95):.2f} s")
+    print(f"Latency  p50 {percentile(latency, 0.5):.2f} s   p95 {percentile(latency, 0.95):.2f} s")
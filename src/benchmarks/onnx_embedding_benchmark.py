@@ -0,0 +1,76 @@
+"""ONNX embedding backend: parity with the PyTorch model plus query latency and ingest throughput.
+
+Exits non-zero if any ONNX variant drops below PARITY_THRESHOLD mean or
+worst-case cosine similarity. Run from anywhere:
+
+    python src/benchmarks/onnx_embedding_benchmark.py
+"""
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+SRC_DIR = Path(__file__).parent.parent.resolve()
+sys.path.append(str(SRC_DIR))
+
+import config
+from models.onnx_embeddings import OnnxEmbeddingModel
+from rag.document_processor import DocumentProcessor
+
+PDF_PATH = config.UPLOADS_DIR / "NIPS-2017-attention-is-all-you-need-Paper.pdf"
+PARITY_THRESHOLD = 0.99
+QUERIES = [
+    "What is multi-head attention?",
+    "Why does the Transformer use positional encodings?",
+    "How long did training the big model take?",
+    "What BLEU score did the model reach on English-to-German?",
+]
+
+def query_latency(model, repeat=25):
+    """p50 / p95 seconds to encode one query, the cost paid on every chat turn"""
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        model.encode([QUERIES[i % len(QUERIES)]])
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+def throughput(model, chunks, batch_size=64):
+    start = time.perf_counter()
+    embeddings = model.encode(chunks, batch_size=batch_size)
+    return len(chunks) / (time.perf_counter() - start), np.asarray(embeddings, dtype=np.float32)
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
+    chunks = DocumentProcessor().process_pdf(str(PDF_PATH))
+
+    variants = [("pytorch", SentenceTransformer(config.EMBEDDING_MODEL, cache_folder=str(config.EMBEDDING_CACHE)))]
+    for quantize in (False, True):
+        start = time.perf_counter()
+        model = OnnxEmbeddingModel.load(quantize=quantize)
+        print(f"onnx {'int8' if quantize else 'fp32'} ready in {time.perf_counter() - start:.2f} s")
+        variants.append(("onnx int8" if quantize else "onnx fp32", model))
+
+    reference = None
+    failed = False
+    print(f"{len(chunks)} chunks from {PDF_PATH.name}")
+    print(f"{'backend':12s} {'query p50':>10s} {'query p95':>10s} {'chunks/s':>10s} {'cos mean':>9s} {'cos min':>8s}")
+    for name, model in variants:
+        model.encode(["warm-up"])
+        p50, p95 = query_latency(model)
+        rate, embeddings = throughput(model, chunks)
+        if reference is None: reference = embeddings
+        similarity = cosine(reference, embeddings)
+        if similarity.min() < PARITY_THRESHOLD: failed = True
+        print(f"{name:12s} {p50 * 1000:8.1f}ms {p95 * 1000:8.1f}ms {rate:10.1f} {similarity.mean():9.4f} {similarity.min():8.4f}")
+
+    if failed:
+        print(f"❌ ONNX embeddings fell below cosine {PARITY_THRESHOLD} against PyTorch")
+        sys.exit(1)
+    print(f"✅ ONNX embeddings match PyTorch (cosine >= {PARITY_THRESHOLD})")
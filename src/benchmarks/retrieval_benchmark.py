@@ -0,0 +1,70 @@
+"""Retrieval benchmark: search latency and recall@k of the NumPy backend against Chroma's HNSW.
+
+Uses random unit vectors at the embedding model's width, so no model is
+needed; NumPy search is exact and serves as ground truth for recall.
+Run from anywhere:  python src/benchmarks/retrieval_benchmark.py --sizes 300 3000 30000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+SRC_DIR = Path(__file__).parent.parent.resolve()
+sys.path.append(str(SRC_DIR))
+
+import config
+from rag.vector_store import NumpyIndex
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def make_collection(client, name, vectors):
+    collection = client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+    ids = [str(i) for i in range(len(vectors))]
+    # Chroma caps the number of records per call
+    for start in range(0, len(vectors), 5000):
+        end = start + 5000
+        collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                       documents=[f"chunk {i}" for i in range(start, min(end, len(vectors)))])
+    return collection
+
+def timed(search, queries):
+    timings, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(search(q))
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+if __name__ == "__main__":
+    import chromadb
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 3000, 30000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=config.TOP_K_RETRIEVAL)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp())
+    print(f"{'chunks':>8s} {'backend':8s} {'p50 ms':>8s} {'p95 ms':>8s} {'recall@' + str(args.top_k):>10s}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+        collection = make_collection(client, f"bench_{size}", vectors)
+        index = NumpyIndex.from_collection(collection, mmap_dir=Path(tempfile.mkdtemp()))
+
+        numpy_times, exact = timed(lambda q: index.search(q, args.top_k), queries)
+        chroma_times, approx = timed(
+            lambda q: collection.query(query_embeddings=[q.tolist()], n_results=args.top_k), queries
+        )
+        recall = np.mean([
+            len(set(a['ids'][0]) & set(e['ids'][0])) / len(e['ids'][0]) for a, e in zip(approx, exact)
+        ])
+        for name, times, r in (("numpy", numpy_times, 1.0), ("chroma", chroma_times, recall)):
+            print(f"{size:8d} {name:8s} {percentile(times, 0.5) * 1000:8.3f} {percentile(times, 0.95) * 1000:8.3f} {r:10.3f}")
@@ -0,0 +1,68 @@
+"""Startup benchmark: cold import time of the app modules and time until the models are ready.
+
+Run from anywhere:  python src/benchmarks/startup_benchmark.py
+"""
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent.resolve()
+sys.path.append(str(SRC_DIR))
+
+APP_MODULES = [
+    "config",
+    "utils.monitoring",
+    "utils.database",
+    "models.llm_handler",
+    "models.scheduler",
+    "rag.document_processor",
+    "rag.retriever",
+    "rag.study_guide",
+    "utils.response_cache",
+    "utils.startup",
+]
+
+HEAVY_MODULES = ["llama_cpp", "sentence_transformers", "torch", "chromadb", "langchain_text_splitters", "pandas", "pypdf"]
+
+def cold_import_time(module):
+    """Import a module in a fresh interpreter and report seconds plus which heavy modules came along"""
+    code = (
+        "import sys, time; sys.path.insert(0, %r); t = time.perf_counter(); import %s; "
+        "print(time.perf_counter() - t, ','.join(m for m in %r if m in sys.modules))"
+    ) % (str(SRC_DIR), module, HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    seconds, _, heavy = result.stdout.strip().splitlines()[-1].partition(" ")
+    return float(seconds), heavy
+
+def time_to_ready(timeout=900):
+    """Run the background warm-up exactly as main.py does and wait for every component"""
+    from utils.monitoring import get_readiness
+    from utils.startup import start_background_warmup
+
+    start = time.perf_counter()
+    start_background_warmup()
+    seen = {}
+    while time.perf_counter() - start < timeout:
+        ready, status = get_readiness()
+        for component, state in status.items():
+            if state != "pending" and state != "loading" and component not in seen:
+                seen[component] = (state, time.perf_counter() - start)
+        if ready or any(s.startswith("failed") for s in status.values()): break
+        time.sleep(0.05)
+    return time.perf_counter() - start, seen
+
+if __name__ == "__main__":
+    print("--- Cold import times ---")
+    for module in APP_MODULES:
+        seconds, heavy = cold_import_time(module)
+        if seconds is None: print(f"{module:28s} FAILED: {heavy}")
+        else: print(f"{module:28s} {seconds * 1000:8.1f} ms   heavy: {heavy or '-'}")
+
+    print("--- Time to ready ---")
+    total, components = time_to_ready()
+    for component, (state, seconds) in components.items():
+        print(f"{component:28s} {state:10s} after {seconds:.2f} s")
+    print(f"Total: {total:.2f} s")
@@ -8,6 +8,7 @@ MODELS_DIR = SRC_DIR / "models"
 VECTOR_DB_DIR = DATA_DIR / "chroma_db"
 UPLOADS_DIR = DATA_DIR / "uploads"
 LOGS_DIR = Path("/app/monitoring/logs")
+HEALTH_PORT = 8001
 
 # Create dirs
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -15,15 +16,134 @@ UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 MODEL_ID = "/app/src/models/mistral-7b.gguf" 
+LLM_GPU_LAYERS = -1
+
+# Inference backend: "llama_cpp" runs MODEL_ID, "mock" emits deterministic text at the rates below (no model or GPU needed)
+LLM_BACKEND = "llama_cpp"
+MOCK_PREFILL_TOKENS_PER_SECOND = 400
+MOCK_DECODE_TOKENS_PER_SECOND = 25
+MOCK_RESPONSE_TOKENS = 128
+
+# Worker pool: 0 runs the model inside the Streamlit process, N > 0 spawns N llama.cpp workers
+LLM_WORKERS = 0
+LLM_WORKER_THREADS = None
+LLM_WORKER_START_TIMEOUT = 600
+LLM_WORKER_HEALTH_INTERVAL = 10
+LLM_WORKER_PING_TIMEOUT = 5
 
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_CACHE = MODELS_DIR / "embeddings"
+
+# Embedding backend: "sentence_transformers" (PyTorch) or "onnx" (onnxruntime, exported once under EMBEDDING_CACHE)
+EMBEDDING_BACKEND = "sentence_transformers"
+EMBEDDING_ONNX_DIR = EMBEDDING_CACHE / "onnx"
+EMBEDDING_ONNX_QUANTIZE = True
+EMBEDDING_MAX_SEQ_LENGTH = 256
 VECTOR_DB_NAME = "quiz_catalyst"
 
+# Bulk (document) embedding: EMBEDDING_PROCESSES > 1 encodes in a sentence-transformers multi-process pool,
+# 0 uses every core; EMBEDDING_PRECISION is "float32", "float16" or "int8"
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_SORT_BY_LENGTH = True
+EMBEDDING_PROCESSES = 1
+EMBEDDING_PRECISION = "float32"
+
+# Query embeddings: requests from all sessions are batched for up to QUERY_BATCH_MAX_WAIT_MS
+QUERY_BATCH_MAX_SIZE = 32
+QUERY_BATCH_MAX_WAIT_MS = 5
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Chunk embeddings keyed by (EMBEDDING_MODEL, sha256 of the chunk text), evicted least recently used
+CHUNK_EMBEDDING_CACHE_ENABLED = True
+CHUNK_EMBEDDING_CACHE_DB = DATA_DIR / "embedding_cache.db"
+CHUNK_EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
 # Parameters
+LLM_CONTEXT_WINDOW = 4096
 MAX_NEW_TOKENS = 1024
 TEMPERATURE = 0.7
 TOP_P = 0.95
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
-TOP_K_RETRIEVAL = 3
\ No newline at end of file
+TOP_K_RETRIEVAL = 3
+
+# Streaming ingest: chunks are embedded and upserted in batches of this size
+# while later pages are still parsed; the parser runs at most
+# INGEST_PREFETCH_CHUNKS ahead of the embedder
+INGEST_BATCH_SIZE = 64
+INGEST_PREFETCH_CHUNKS = 256
+
+# Parallel PDF extraction: documents of at least PDF_PARALLEL_MIN_PAGES pages are
+# split into one page range per worker process, each of at least
+# PDF_EXTRACT_MIN_PAGES_PER_PROCESS pages.
+# PDF_EXTRACT_PROCESSES = 0 uses every core; 1 forces the serial path
+PDF_EXTRACT_PROCESSES = 0
+PDF_PARALLEL_MIN_PAGES = 40
+PDF_EXTRACT_MIN_PAGES_PER_PROCESS = 8
+
+# Parsed documents (page texts and chunks with offsets) by SHA-256 of the PDF, as gzip JSONL
+ARTIFACT_DIR = DATA_DIR / "artifacts"
+
+# Retrieval backend: "numpy" (exact, in memory), "chroma" (HNSW) or "auto" (numpy up to NUMPY_RETRIEVAL_MAX_CHUNKS)
+RETRIEVAL_BACKEND = "auto"
+NUMPY_RETRIEVAL_MAX_CHUNKS = 20000
+NUMPY_INDEX_MMAP = True
+NUMPY_INDEX_DIR = DATA_DIR / "numpy_index"
+
+# Retrieval mode: "dense", "bm25" or "hybrid" (reciprocal rank fusion of HYBRID_CANDIDATES from each)
+RETRIEVAL_MODE = "hybrid"
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_INDEX_DIR = VECTOR_DB_DIR / "bm25"
+
+# Prompt prefix cache (per-chat llama.cpp state reuse)
+PROMPT_CACHE_ENABLED = True
+PROMPT_CACHE_MAX_STATES = 4
+PROMPT_CACHE_SPILL_TO_DISK = True
+PROMPT_CACHE_MAX_DISK_STATES = 32
+PROMPT_CACHE_DIR = DATA_DIR / "prompt_cache"
+
+
+# Inference scheduler (admission control in front of the shared model)
+SCHEDULER_MAX_QUEUE = 32
+SCHEDULER_MAX_PER_USER = 2
+SCHEDULER_QUEUE_TIMEOUT = 120
+
+# Prompt token budgets (the completion always keeps MAX_NEW_TOKENS of room)
+HISTORY_MAX_TOKENS = 2048
+CONTEXT_MAX_TOKENS = 1536
+CONTEXT_MIN_PARTIAL_TOKENS = 64
+CONTEXT_SAFETY_MARGIN = 16
+# Merge retrieved chunks that overlap in the source text (needs start_index metadata) before fitting them
+CONTEXT_COMPACTION = True
+
+# Background jobs (chat titles and other housekeeping LLM calls)
+BACKGROUND_JOB_MAX_ATTEMPTS = 3
+BACKGROUND_POLL_INTERVAL = 5
+
+# Document ingestion runs as background jobs; the UI polls their progress every INGEST_POLL_SECONDS
+INGEST_WORKERS = 1
+INGEST_POLL_SECONDS = 1.0
+
+# Study guide generation
+STUDY_GUIDE_MAX_PAIRS = 12
+STUDY_GUIDE_CHUNKS_PER_PROMPT = 3
+STUDY_GUIDE_TOKENS_PER_PAIR = 160
+# Upper bound on generating one batch; extends the queue timeout of batches waiting behind it
+STUDY_GUIDE_BATCH_TIMEOUT = 600
+
+# Semantic response cache
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_THRESHOLD = 0.95
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+
+# Speculative decoding: "prompt_lookup" (n-gram lookup in the prompt), "draft_model" or "off"
+SPECULATIVE_MODE = "prompt_lookup"
+SPECULATIVE_NUM_PRED_TOKENS = 10
+SPECULATIVE_MAX_NGRAM = 2
+DRAFT_MODEL_ID = MODELS_DIR / "draft.gguf"
+# Draft model layers on the GPU; defaults to the main model's setting
+DRAFT_GPU_LAYERS = LLM_GPU_LAYERS
@@ -3,23 +3,30 @@ import sys
 from pathlib import Path
 import time
 import os
+import threading
 
 sys.path.append(str(Path(__file__).parent))
 import config
 
 from models.llm_handler import get_llm_handler
-from rag.document_processor import DocumentProcessor
+from models.scheduler import get_inference_scheduler, SchedulerFullError, RequestTimeoutError
+from rag.document_processor import DocumentProcessor, document_hash
 from rag.retriever import Retriever
+from rag.study_guide import StudyGuideGenerator
 from utils.auth import show_login_page
 from utils.feedback_ui import display_message_with_feedback
+from utils.response_cache import get_response_cache
+from utils.startup import start_background_warmup
+from utils.task_runner import get_task_runner, get_ingest_runner, ingest_job_key
 from utils.database import (
     create_new_chat_in_db, get_user_chats, get_chat_messages, 
-    save_message_to_db, update_chat_title, update_chat_mode_pdf
+    save_message_to_db, update_chat_title, update_chat_mode_pdf, update_chat_study_guide, get_chat_titles,
+    get_job
 )
 from utils.monitoring import (
-    start_metrics_server, RESPONSE_COUNTER, LENGTH_GAUGE, LATENCY_SUMMARY,
+    start_metrics_server, start_health_server, RESPONSE_COUNTER, LENGTH_GAUGE, LATENCY_SUMMARY,
     RETRIEVAL_LATENCY, SIMILARITY_SCORE, RETRIEVAL_ATTEMPTS, RETRIEVAL_HITS,
-    INDEX_SIZE, INDEX_FRESHNESS, DOCS_INDEXED, UPLOAD_ERRORS, LARGE_FILES
+    UPLOAD_ERRORS, LARGE_FILES
 )
 
 UPLOADS_DIR = Path(__file__).parent / "data" / "uploads"
@@ -43,15 +50,29 @@ if 'authenticated' not in st.session_state: st.session_state.authenticated = Fal
 if 'user' not in st.session_state: st.session_state.user = None
 if 'current_chat_id' not in st.session_state: st.session_state.current_chat_id = None
 if 'llm_handler' not in st.session_state: st.session_state.llm_handler = None
+if 'scheduler' not in st.session_state: st.session_state.scheduler = None
 if 'retriever' not in st.session_state: st.session_state.retriever = None
 if 'doc_processor' not in st.session_state: st.session_state.doc_processor = DocumentProcessor()
-if 'active_processed_pdf' not in st.session_state: st.session_state.active_processed_pdf = None
+if 'active_document' not in st.session_state: st.session_state.active_document = None
 if 'socratic_state' not in st.session_state: st.session_state.socratic_state = "IDLE"
 
-def save_uploaded_file(uploaded_file):
+def uploaded_file_path(doc_hash):
+    return UPLOADS_DIR / f"{doc_hash}.pdf"
+
+def save_uploaded_file(uploaded_file, doc_hash):
+    """Save an upload or open file under its content hash, so a later upload with the same name never replaces it"""
     try:
-        file_path = UPLOADS_DIR / uploaded_file.name
-        with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
+        file_path = uploaded_file_path(doc_hash)
+        if file_path.exists(): return file_path
+        if hasattr(uploaded_file, 'getbuffer'):
+            data = uploaded_file.getbuffer()
+        else:
+            uploaded_file.seek(0)
+            data = uploaded_file.read()
+            uploaded_file.seek(0)
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f: f.write(data)
+        os.replace(tmp_path, file_path)
         return file_path
     except Exception as e: print(f"Error saving file: {e}"); return None
 
@@ -63,7 +84,7 @@ def create_new_chat():
     create_new_chat_in_db(chat_id, st.session_state.user['id'])
     st.session_state.chat_sessions[chat_id] = {
         'messages': [], 'title': 'New Chat', 'timestamp': time.time(),
-        'mode': "LLM", 'pdf_name': None, 'pdf_ref': None, 'study_guide': None
+        'mode': "LLM", 'pdf_name': None, 'doc_hash': None, 'pdf_ref': None, 'study_guide': None
     }
     st.session_state.current_chat_id = chat_id
     st.session_state.socratic_state = "IDLE" 
@@ -77,7 +98,8 @@ def switch_chat(chat_id):
 def get_current_chat():
     if not st.session_state.current_chat_id: create_new_chat()
     chat = st.session_state.chat_sessions[st.session_state.current_chat_id]
-    if chat.get('pdf_name') and chat.get('pdf_ref') is None:
+    # Chats saved before documents were referenced by hash need the file once to hash it
+    if chat.get('pdf_name') and not chat.get('doc_hash') and chat.get('pdf_ref') is None:
         file_path = UPLOADS_DIR / chat['pdf_name']
         if file_path.exists(): chat['pdf_ref'] = open(file_path, "rb")
         else: chat['pdf_name'] = None
@@ -85,44 +107,86 @@ def get_current_chat():
 
 def initialize_llm():
     if st.session_state.llm_handler is None: st.session_state.llm_handler = get_llm_handler()
+    if st.session_state.scheduler is None: st.session_state.scheduler = get_inference_scheduler()
 
 def process_pdf(uploaded_file, chat_data):
-    try:
-        if st.session_state.llm_handler is None:
-            with st.spinner("⚙️ Loading AI Model..."): initialize_llm()
-        
-        file_name = uploaded_file.name if hasattr(uploaded_file, 'name') else "document.pdf"
-        if hasattr(uploaded_file, 'size') and uploaded_file.size > 10 * 1024 * 1024:
-            LARGE_FILES.inc(); st.warning("⚠️ Large file detected.")
-
-        if hasattr(uploaded_file, 'getbuffer'): save_uploaded_file(uploaded_file)
-
-        with st.spinner(f"📄 Processing '{file_name}'..."):
-            st.session_state.retriever = Retriever()
-            chunks = st.session_state.doc_processor.process_pdf(uploaded_file)
-            st.session_state.retriever.add_documents_to_store(chunks)
-            
-            DOCS_INDEXED.inc(); INDEX_FRESHNESS.set_to_current_time(); INDEX_SIZE.inc(sum(len(c) for c in chunks))
+    """Attach a PDF to the chat: an upload or open file is saved and hashed, None reopens the chat's document by its hash.
 
-            chat_data['pdf_name'] = file_name
-            chat_data['pdf_ref'] = uploaded_file
-            st.session_state.active_processed_pdf = file_name
-            
-            if chunks:
-                prompt = f"Generate a 3-word title for: '{chunks[0][:200]}'"
-                try:
-                    new_title = st.session_state.llm_handler.generate_response(prompt, max_new_tokens=20).replace('"', '').replace("Title:", "").strip()
-                    chat_data['title'] = new_title
-                    update_chat_title(st.session_state.current_chat_id, new_title)
-                except Exception: pass
-
-            update_chat_mode_pdf(st.session_state.current_chat_id, chat_data['mode'], file_name, chat_data.get('study_guide'))
-            return True
+    Already indexed documents open at once; others are queued for ingestion (see show_ingest_progress).
+    """
+    try:
+        if uploaded_file is None:
+            file_name, doc_hash = chat_data['pdf_name'], chat_data['doc_hash']
+            file_path = uploaded_file_path(doc_hash)
+            # Documents hashed before uploads were saved by hash; ingest_document checks the content
+            if not file_path.exists(): file_path = UPLOADS_DIR / file_name
+        else:
+            # Files reopened from disk are named by their full path
+            file_name = Path(uploaded_file.name).name if hasattr(uploaded_file, 'name') else "document.pdf"
+            if hasattr(uploaded_file, 'size') and uploaded_file.size > 10 * 1024 * 1024:
+                LARGE_FILES.inc(); st.warning("⚠️ Large file detected.")
+
+            doc_hash = document_hash(uploaded_file)
+            file_path = save_uploaded_file(uploaded_file, doc_hash)
+            if file_path is None: raise IOError(f"could not save '{file_name}'")
+
+        user_id = st.session_state.user['id']
+        chat_id = st.session_state.current_chat_id
+        st.session_state.retriever = Retriever()
+        if st.session_state.retriever.open_document(user_id, doc_hash):
+            # Same content already indexed for this user: nothing to extract or embed
+            chat_data['ingest_key'] = None
+            first_chunk = st.session_state.retriever.vector_store.first_chunk()
+            if first_chunk and hasattr(uploaded_file, 'getbuffer'):
+                get_task_runner().submit("chat_title", {'chat_id': chat_id, 'text': first_chunk[:200]}, dedup_key=f"chat_title:{chat_id}")
+        else:
+            # Chunks become searchable batch by batch while the job runs
+            chat_data['ingest_key'] = ingest_job_key(user_id, doc_hash)
+            payload = {'user_id': user_id, 'doc_hash': doc_hash, 'file_name': file_name, 'path': str(file_path)}
+            if hasattr(uploaded_file, 'getbuffer'): payload['chat_id'] = chat_id
+            get_ingest_runner().submit("ingest", payload, dedup_key=chat_data['ingest_key'])
+
+        chat_data['pdf_name'] = file_name
+        chat_data['doc_hash'] = doc_hash
+        chat_data['pdf_ref'] = uploaded_file
+        st.session_state.active_document = doc_hash
+        update_chat_mode_pdf(chat_id, chat_data['mode'], chat_data['pdf_name'], chat_data.get('study_guide'), doc_hash)
+        return True
     except Exception as e:
         UPLOAD_ERRORS.inc(); st.error(f"❌ Processing failed: {e}"); return False
 
+@st.fragment(run_every=config.INGEST_POLL_SECONDS)
+def show_ingest_progress(chat_data):
+    """Poll the chat's ingestion job; reruns the whole page once the document is fully indexed"""
+    job = get_job(chat_data['ingest_key']) if chat_data.get('ingest_key') else None
+    if job is None: return
+    progress = job['progress']
+    if job['status'] == "done":
+        chat_data['ingest_key'] = None
+        # Reopen so indexes built from the partial collection are dropped and new ones may be saved
+        if st.session_state.retriever: st.session_state.retriever.open_document(st.session_state.user['id'], chat_data['doc_hash'])
+        st.rerun()
+    elif job['status'] == "failed":
+        st.error(f"❌ Processing failed: {job['error']}")
+    elif not progress:
+        st.caption("⏳ Queued for processing...")
+    else:
+        if progress.get('chunks') != chat_data.get('ingest_chunks') and st.session_state.retriever:
+            # New batches were stored: let the next query rebuild the in-memory indexes
+            chat_data['ingest_chunks'] = progress.get('chunks')
+            st.session_state.retriever.vector_store.reset_indexes()
+        pages = progress.get('pages') or 1
+        st.progress(
+            min(1.0, progress.get('page', 0) / pages),
+            text=f"📄 Indexed page {progress.get('page', 0)}/{pages} · {progress.get('chunks', 0)} chunks searchable"
+        )
+
 def main():
     start_metrics_server()
+    start_health_server(config.HEALTH_PORT)
+    start_background_warmup()
+    # Started with the app so jobs interrupted by a restart resume without waiting for an upload
+    get_task_runner(); get_ingest_runner()
 
     if not st.session_state.authenticated: show_login_page(); return
     if 'chat_sessions' not in st.session_state: load_user_chats()
@@ -131,9 +195,18 @@ def main():
         if st.session_state.chat_sessions: switch_chat(list(st.session_state.chat_sessions.keys())[0])
         else: create_new_chat()
 
+    # Titles may have been filled in by background jobs since the last rerun
+    for chat_id, title in get_chat_titles(st.session_state.user['id']).items():
+        if chat_id in st.session_state.chat_sessions: st.session_state.chat_sessions[chat_id]['title'] = title
+
     current_chat = get_current_chat()
     if not current_chat['messages']: current_chat['messages'] = get_chat_messages(st.session_state.current_chat_id)
 
+    # Switching to a chat reopens its document by hash: no file is read or parsed once it is indexed
+    if current_chat['mode'] == "RAG + LLM" and current_chat.get('pdf_name'):
+        if not current_chat.get('doc_hash'): process_pdf(current_chat['pdf_ref'], current_chat)
+        elif st.session_state.active_document != current_chat['doc_hash']: process_pdf(None, current_chat)
+
     with st.sidebar:
         st.title("🎓 QuizCatalyst")
         st.markdown(f"<div class='sidebar-user'>User: <b>{st.session_state.user['username']}</b></div>", unsafe_allow_html=True)
@@ -156,16 +229,26 @@ def main():
             else:
                 uploaded = st.file_uploader("Upload PDF", type=['pdf'], key=f"up_{st.session_state.current_chat_id}")
                 if uploaded and current_chat.get('pdf_name') != uploaded.name:
-                    if process_pdf(uploaded, current_chat): st.success("Processed!"); time.sleep(0.5); st.rerun()
+                    if process_pdf(uploaded, current_chat): st.rerun()
                 
                 st.divider()
                 if st.button("✨ Study Guide", use_container_width=True):
                     if current_chat.get('pdf_name'):
                         with st.spinner("Generating..."):
-                            qa = st.session_state.llm_handler.generate_qa_for_batch(st.session_state.retriever.vector_store.collection.get()['documents'][:4])
-                            current_chat['study_guide'] = "\n\n".join(qa)
-                            update_chat_mode_pdf(st.session_state.current_chat_id, current_chat['mode'], current_chat['pdf_name'], current_chat['study_guide'])
-                            st.rerun()
+                            initialize_llm()
+                            generator = StudyGuideGenerator(st.session_state.llm_handler, st.session_state.scheduler, st.session_state.retriever.vector_store)
+                            preview = st.empty()
+                            n_pairs = 0
+                            try:
+                                for guide, n_pairs in generator.generate(user_id=st.session_state.user['id']):
+                                    current_chat['study_guide'] = guide
+                                    update_chat_study_guide(st.session_state.current_chat_id, guide)
+                                    preview.caption(f"📝 {n_pairs} Q&A pairs so far...")
+                            except (SchedulerFullError, RequestTimeoutError) as e:
+                                # Pairs from finished batches are already saved with the chat
+                                st.error(f"❌ Study guide stopped after {n_pairs} Q&A pairs: {e}")
+                            else:
+                                st.rerun()
                     else: st.error("Upload first!")
 
     with col_mode:
@@ -173,12 +256,13 @@ def main():
             new_mode = st.radio("Mode", ["LLM", "RAG + LLM"], index=0 if current_chat['mode'] == "LLM" else 1)
             if new_mode != current_chat['mode']:
                 current_chat['mode'] = new_mode
-                if new_mode == "LLM": current_chat['pdf_name'] = None
-                update_chat_mode_pdf(st.session_state.current_chat_id, new_mode, current_chat['pdf_name'], current_chat.get('study_guide'))
+                if new_mode == "LLM": current_chat['pdf_name'] = current_chat['doc_hash'] = None
+                update_chat_mode_pdf(st.session_state.current_chat_id, new_mode, current_chat['pdf_name'], current_chat.get('study_guide'), current_chat.get('doc_hash'))
                 st.rerun()
 
     if current_chat.get('pdf_name') and current_chat['mode'] == "RAG + LLM":
         st.markdown(f"""<div class="uploaded-file-chip">📄 <strong>{current_chat['pdf_name']}</strong></div>""", unsafe_allow_html=True)
+        show_ingest_progress(current_chat)
 
     if current_chat.get('study_guide'):
         with st.expander("📝 Study Guide", expanded=True):
@@ -199,17 +283,18 @@ def main():
 
         current_chat['messages'].append({"role": "user", "content": prompt})
         save_message_to_db(st.session_state.current_chat_id, "user", prompt)
+        with st.chat_message("user"): st.markdown(prompt)
         if current_chat['title'] == "New Chat":
              update_chat_title(st.session_state.current_chat_id, prompt[:30] + "...")
 
         try:
             response = ""
             llm = st.session_state.llm_handler
+            scheduler = st.session_state.scheduler
+            user_id = st.session_state.user['id']
             start_time = time.time()
             
             if current_chat['mode'] == "RAG + LLM":
-                if st.session_state.active_processed_pdf != current_chat['pdf_name']:
-                     process_pdf(current_chat['pdf_ref'], current_chat)
                 
                 retriever = st.session_state.retriever
                 RETRIEVAL_ATTEMPTS.inc()
@@ -221,15 +306,36 @@ def main():
                 RETRIEVAL_LATENCY.observe(time.time() - start_ret)
                 if context: RETRIEVAL_HITS.inc()
                 
-                if results and 'distances' in results:
-                    try: SIMILARITY_SCORE.observe(results['distances'][0][0])
-                    except: pass
-
-                with st.spinner("🤖 Thinking..."):
-                    response = llm.generate_rag_response(prompt, context)
+                # Hybrid results carry no distance for chunks found only by BM25
+                distances = results.get('distances') if results else None
+                if distances and distances[0] and distances[0][0] is not None:
+                    SIMILARITY_SCORE.observe(distances[0][0])
+
+                cache_context = "\n\n".join(results['documents'][0])
+                document_id = current_chat['doc_hash']
+                start_stream = lambda: scheduler.stream(
+                    llm.stream_rag_response, prompt, results['documents'][0], results['metadatas'][0], user_id=user_id
+                )
             else:
-                with st.spinner("🤖 Thinking..."):
-                    response = llm.generate_response(current_chat['messages'])
+                cache_context = llm.build_prompt(current_chat['messages'][:-1])
+                document_id = None
+                start_stream = lambda: scheduler.stream(
+                    llm.stream_response, current_chat['messages'],
+                    chat_id=st.session_state.current_chat_id, user_id=user_id
+                )
+
+            response_cache = get_response_cache() if config.RESPONSE_CACHE_ENABLED else None
+            cached, prompt_embedding = None, None
+            if response_cache: cached, prompt_embedding = response_cache.lookup(prompt, cache_context, llm.generation_params())
+
+            with st.chat_message("assistant"):
+                if cached is not None:
+                    response = cached
+                    st.markdown(response)
+                else:
+                    response = (st.write_stream(start_stream()) or "").strip()
+                    if response_cache and response:
+                        response_cache.store(prompt, prompt_embedding, cache_context, llm.generation_params(), response, document_id)
             
             duration = time.time() - start_time
             LATENCY_SUMMARY.observe(duration)
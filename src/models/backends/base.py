@@ -0,0 +1,49 @@
+import config
+
+class LLMBackend:
+    """The inference engine behind LLMHandler.
+
+    Text goes in and comes out as str, token ids are plain ints. A backend
+    keeps the tokens it last evaluated so that a following prompt sharing
+    that prefix only pays for prefilling the rest.
+    """
+
+    draft_model = None
+    decoding_mode = "off"
+
+    def n_ctx(self):
+        raise NotImplementedError
+
+    def tokenize(self, text, add_bos=False):
+        raise NotImplementedError
+
+    def detokenize(self, tokens):
+        raise NotImplementedError
+
+    def evaluated_tokens(self):
+        """Tokens currently held in the backend's KV cache"""
+        raise NotImplementedError
+
+    def save_state(self):
+        raise NotImplementedError
+
+    def load_state(self, state):
+        raise NotImplementedError
+
+    def set_decoding_mode(self, mode):
+        """Backends without speculative decoding ignore the requested mode"""
+
+    def stream(self, prompt_text, max_tokens, temperature, stop):
+        """Yield the completion of prompt_text one token's text at a time"""
+        raise NotImplementedError
+
+def create_backend(name=None, **kwargs):
+    """Build the backend selected by config.LLM_BACKEND, importing only what it needs"""
+    name = name or config.LLM_BACKEND
+    if name == "llama_cpp":
+        from models.backends.llama_cpp_backend import LlamaCppBackend
+        return LlamaCppBackend(**kwargs)
+    if name == "mock":
+        from models.backends.mock import MockBackend
+        return MockBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,58 @@
+from llama_cpp import Llama
+import config
+from models.backends.base import LLMBackend
+from models.speculative import build_draft_model
+
+class LlamaCppBackend(LLMBackend):
+    """MODEL_ID run in-process by llama.cpp, with optional speculative decoding"""
+
+    def __init__(self, n_threads=None, decoding_mode=None, vocab_only=False):
+        if vocab_only:
+            # Enough to count and trim prompt tokens, nothing is evaluated
+            self.model = Llama(model_path=str(config.MODEL_ID), vocab_only=True, verbose=False)
+            return
+        self.decoding_mode = decoding_mode or config.SPECULATIVE_MODE
+        self.draft_model = build_draft_model(self.decoding_mode)
+        self.model = Llama(
+            model_path=str(config.MODEL_ID),
+            n_ctx=config.LLM_CONTEXT_WINDOW,
+            n_gpu_layers=config.LLM_GPU_LAYERS,
+            n_threads=n_threads,
+            draft_model=self.draft_model,
+            verbose=True
+        )
+
+    def n_ctx(self):
+        return self.model.n_ctx()
+
+    def tokenize(self, text, add_bos=False):
+        return self.model.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True)
+
+    def detokenize(self, tokens):
+        return self.model.detokenize(tokens).decode("utf-8", errors="ignore")
+
+    def evaluated_tokens(self):
+        # input_ids is an n_ctx-sized buffer; only the first n_tokens are in the KV cache
+        return self.model.input_ids[:self.model.n_tokens].tolist()
+
+    def save_state(self):
+        return self.model.save_state()
+
+    def load_state(self, state):
+        self.model.load_state(state)
+
+    def set_decoding_mode(self, mode):
+        self.decoding_mode = mode
+        self.draft_model = build_draft_model(mode)
+        self.model.draft_model = self.draft_model
+
+    def stream(self, prompt_text, max_tokens, temperature, stop):
+        for chunk in self.model(
+            prompt_text,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stop=stop,
+            echo=False,
+            stream=True
+        ):
+            yield chunk['choices'][0]['text']
@@ -0,0 +1,73 @@
+import hashlib
+import random
+import re
+import threading
+import time
+import config
+from models.backends.base import LLMBackend
+from models.prompt_cache import longest_common_prefix
+
+BOS_ID = 1
+WORDS = (
+    "the model attention layer token sequence encoder decoder training data loss gradient "
+    "vector query key value context answer question student concept example result method"
+).split()
+
+class MockBackend(LLMBackend):
+    """Deterministic stand-in for llama.cpp, for load tests on CPU-only machines.
+
+    Each whitespace-led word is one token. The same prompt always yields the
+    same completion, and time is spent like a real model: prefill at
+    MOCK_PREFILL_TOKENS_PER_SECOND for the part of the prompt not already
+    evaluated, then one token every 1 / MOCK_DECODE_TOKENS_PER_SECOND.
+    """
+
+    def __init__(self, n_threads=None, decoding_mode=None, vocab_only=False,
+                 prefill_rate=None, decode_rate=None, response_tokens=None):
+        self.prefill_rate = prefill_rate or config.MOCK_PREFILL_TOKENS_PER_SECOND
+        self.decode_rate = decode_rate or config.MOCK_DECODE_TOKENS_PER_SECOND
+        self.response_tokens = response_tokens or config.MOCK_RESPONSE_TOKENS
+        self.vocab = {}
+        self.pieces = [""] * (BOS_ID + 1)
+        self.vocab_lock = threading.Lock()
+        self.input_ids = []
+
+    def n_ctx(self):
+        return config.LLM_CONTEXT_WINDOW
+
+    def _token_id(self, piece):
+        with self.vocab_lock:
+            if piece not in self.vocab:
+                self.vocab[piece] = len(self.pieces)
+                self.pieces.append(piece)
+            return self.vocab[piece]
+
+    def tokenize(self, text, add_bos=False):
+        tokens = [self._token_id(piece) for piece in re.findall(r"\s*\S+|\s+", text)]
+        return [BOS_ID] + tokens if add_bos else tokens
+
+    def detokenize(self, tokens):
+        return "".join(self.pieces[t] for t in tokens)
+
+    def evaluated_tokens(self):
+        return list(self.input_ids)
+
+    def save_state(self):
+        return list(self.input_ids)
+
+    def load_state(self, state):
+        self.input_ids = list(state)
+
+    def stream(self, prompt_text, max_tokens, temperature, stop):
+        prompt_tokens = self.tokenize(prompt_text, add_bos=True)
+        reused = longest_common_prefix(self.input_ids, prompt_tokens)
+        time.sleep((len(prompt_tokens) - reused) / self.prefill_rate)
+        self.input_ids = prompt_tokens
+
+        seed = int(hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        for i in range(min(max_tokens, self.response_tokens)):
+            time.sleep(1 / self.decode_rate)
+            piece = rng.choice(WORDS) if i == 0 else " " + rng.choice(WORDS)
+            self.input_ids.append(self._token_id(piece))
+            yield piece
@@ -0,0 +1,79 @@
+import config
+from utils.monitoring import PROMPT_SECTION_TOKENS, PROMPT_SECTION_TRIMMED
+
+class ContextWindowManager:
+    """Fits chat history and retrieved chunks into the model's token budget.
+
+    Token counts come from the model's own tokenizer, so the budget is exact
+    rather than a character estimate.
+    """
+
+    def __init__(self, model, n_ctx=None):
+        self.model = model
+        self.n_ctx = n_ctx or config.LLM_CONTEXT_WINDOW
+
+    def count(self, text):
+        return len(self.model.tokenize(text))
+
+    def truncate(self, text, max_tokens, keep="head"):
+        """Cut text to at most max_tokens tokens, keeping its head or its tail"""
+        tokens = self.model.tokenize(text)
+        if len(tokens) <= max_tokens: return text
+        if max_tokens <= 0: return ""
+        tokens = tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:]
+        return self.model.detokenize(tokens)
+
+    def prompt_budget(self, max_new_tokens):
+        """Tokens left for the prompt once the completion has its room"""
+        return self.n_ctx - max_new_tokens - config.CONTEXT_SAFETY_MARGIN
+
+    def fit_history(self, messages, budget, render):
+        """Keep the newest turns that fit in budget, dropping the oldest first.
+
+        The latest message is always kept (truncated if it alone is too long),
+        and the kept window never starts with an assistant turn.
+        """
+        budget = min(budget, config.HISTORY_MAX_TOKENS)
+        if not messages: return []
+
+        latest = dict(messages[-1])
+        used = self.count(render([latest]))
+        if used > budget:
+            latest['content'] = self.truncate(latest['content'], budget - (used - self.count(latest['content'])))
+            used = self.count(render([latest]))
+            PROMPT_SECTION_TRIMMED.labels(section="question").inc()
+        PROMPT_SECTION_TOKENS.labels(section="question").observe(used)
+
+        kept = []
+        history_tokens = 0
+        for msg in reversed(messages[:-1]):
+            cost = self.count(render([msg]))
+            if used + history_tokens + cost > budget: break
+            kept.append(msg)
+            history_tokens += cost
+        kept.reverse()
+
+        while kept and kept[0]['role'] != 'user':
+            history_tokens -= self.count(render([kept.pop(0)]))
+        if len(kept) < len(messages) - 1: PROMPT_SECTION_TRIMMED.labels(section="history").inc()
+        PROMPT_SECTION_TOKENS.labels(section="history").observe(history_tokens)
+        return kept + [latest]
+
+    def fit_chunks(self, chunks, budget):
+        """Keep chunks in rank order until budget is spent, truncating the last one that fits partially"""
+        budget = min(budget, config.CONTEXT_MAX_TOKENS)
+        kept = []
+        used = 0
+        for chunk in chunks:
+            cost = self.count(chunk)
+            if used + cost > budget:
+                remaining = budget - used
+                if remaining >= config.CONTEXT_MIN_PARTIAL_TOKENS:
+                    kept.append(self.truncate(chunk, remaining))
+                    used = budget
+                PROMPT_SECTION_TRIMMED.labels(section="context").inc()
+                break
+            kept.append(chunk)
+            used += cost
+        PROMPT_SECTION_TOKENS.labels(section="context").observe(used)
+        return kept
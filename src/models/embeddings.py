@@ -1,24 +1,65 @@
-from sentence_transformers import SentenceTransformer
+import atexit
+import os
+import time
+import numpy as np
 import config
-import streamlit as st
+from utils.resources import RESOURCES
+from utils.embedding_cache import EmbeddingCache, hash_text
+from utils.monitoring import EMBEDDING_THROUGHPUT, EMBEDDING_CACHE_LOOKUPS, EMBEDDING_CACHE_BYTES_SAVED
 
-class EmbeddingHandler:
-    def __init__(self):
-        self.model = None
+PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+def quantize(embeddings, precision):
+    """Cast float32 embeddings to the output precision.
+
+    int8 uses a fixed scale of 127 on unit-normalized vectors, so values do
+    not depend on which batch a chunk was encoded in. Cosine similarity is
+    scale invariant, so the result can be stored and searched as is.
+    """
+    if precision == "float32": return embeddings
+    if precision == "float16": return embeddings.astype(np.float16)
+    if precision == "int8":
+        norms = np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return np.clip(np.round(embeddings / norms * 127), -127, 127).astype(np.int8)
+    raise ValueError(f"Unknown embedding precision: {precision}")
+
+def build_embedding_model():
+    """Load sentence transformer model for embeddings (cached locally)"""
+    print(f"📥 Loading embedding model: {config.EMBEDDING_MODEL} ({config.EMBEDDING_BACKEND})")
+    print(f"💾 Cache location: {config.EMBEDDING_CACHE}")
     
-    @st.cache_resource
-    def load_embedding_model(_self):
-        """Load sentence transformer model for embeddings (cached locally)"""
-        print(f"📥 Loading embedding model: {config.EMBEDDING_MODEL}")
-        print(f"💾 Cache location: {config.EMBEDDING_CACHE}")
-        
-        _self.model = SentenceTransformer(
+    if config.EMBEDDING_BACKEND == "onnx":
+        from models.onnx_embeddings import OnnxEmbeddingModel
+        model = OnnxEmbeddingModel.load()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(
             config.EMBEDDING_MODEL,
             cache_folder=str(config.EMBEDDING_CACHE)
         )
-        
-        print("✅ Embedding model loaded successfully!")
-        return _self.model
+    
+    print("✅ Embedding model loaded successfully!")
+    return model
+
+class EmbeddingHandler:
+    """Lightweight per-caller handle; the model itself lives in the process-wide registry"""
+    
+    def __init__(self):
+        self.model = None
+        self.cache = None
+    
+    def load_embedding_model(self):
+        """The process-wide embedding model, loaded on first use"""
+        return RESOURCES.get("embedding_model", build_embedding_model)
+    
+    def start_encode_pool(self, processes):
+        """One sentence-transformers multi-process pool per process count, stopped at exit"""
+        def build():
+            print(f"🚀 Starting {processes} embedding processes")
+            pool = self.model.start_multi_process_pool(target_devices=["cpu"] * processes)
+            atexit.register(self.model.stop_multi_process_pool, pool)
+            return pool
+        return RESOURCES.get(f"embedding_pool_{processes}", build)
     
     def get_embeddings(self, texts):
         """Generate embeddings for given texts"""
@@ -26,4 +67,63 @@ class EmbeddingHandler:
             self.model = self.load_embedding_model()
         
         embeddings = self.model.encode(texts, show_progress_bar=True)
-        return embeddings
\ No newline at end of file
+        return embeddings
+    
+    def encode_bulk(self, texts, batch_size=None, sort_by_length=None, processes=None, precision=None):
+        """Encode many texts for indexing, returning an array in the requested precision.
+
+        Texts are sorted longest first so each batch pads to similar lengths;
+        sentence-transformers sorts within one encode call, but a
+        multi-process pool splits the input before its workers sort.
+        """
+        if self.model is None:
+            self.model = self.load_embedding_model()
+        batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        sort_by_length = config.EMBEDDING_SORT_BY_LENGTH if sort_by_length is None else sort_by_length
+        processes = config.EMBEDDING_PROCESSES if processes is None else processes
+        processes = processes or os.cpu_count() or 1
+        precision = precision or config.EMBEDDING_PRECISION
+        
+        order = np.argsort([-len(t) for t in texts], kind="stable") if sort_by_length else np.arange(len(texts))
+        ordered = [texts[i] for i in order]
+        
+        start = time.time()
+        # onnxruntime already spreads one batch over all cores
+        if processes > 1 and len(texts) > batch_size and config.EMBEDDING_BACKEND == "sentence_transformers":
+            pool = self.start_encode_pool(processes)
+            encoded = self.model.encode_multi_process(ordered, pool, batch_size=batch_size)
+            mode = "multi_process"
+        else:
+            encoded = self.model.encode(ordered, batch_size=batch_size, show_progress_bar=False)
+            mode = "single_process"
+        EMBEDDING_THROUGHPUT.labels(mode=mode).observe(len(texts) / max(time.time() - start, 1e-6))
+        
+        embeddings = np.empty_like(np.asarray(encoded, dtype=np.float32))
+        embeddings[order] = encoded
+        return quantize(embeddings, precision)
+    
+    def get_chunk_embeddings(self, chunks):
+        """Embeddings for document chunks, encoding only those missing from the embedding cache"""
+        if not config.CHUNK_EMBEDDING_CACHE_ENABLED:
+            return self.encode_bulk(chunks)
+        if self.cache is None:
+            self.cache = EmbeddingCache()
+        
+        # Each backend and precision is cached under its own key
+        cache_key = f"{config.EMBEDDING_MODEL}:{config.EMBEDDING_BACKEND}@{config.EMBEDDING_PRECISION}"
+        hashes = [hash_text(c) for c in chunks]
+        found = self.cache.get_many(cache_key, hashes, dtype=PRECISIONS[config.EMBEDDING_PRECISION])
+        missing = {h: c for h, c in zip(hashes, chunks) if h not in found}
+        
+        n_hits = len(chunks) - sum(h in missing for h in hashes)
+        EMBEDDING_CACHE_LOOKUPS.labels(result="hit").inc(n_hits)
+        EMBEDDING_CACHE_LOOKUPS.labels(result="miss").inc(len(chunks) - n_hits)
+        EMBEDDING_CACHE_BYTES_SAVED.inc(sum(len(c.encode("utf-8")) for h, c in zip(hashes, chunks) if h in found))
+        print(f"💾 Embedding cache: {n_hits}/{len(chunks)} chunks cached")
+        
+        if missing:
+            encoded = self.encode_bulk(list(missing.values()))
+            new = dict(zip(missing.keys(), encoded))
+            self.cache.put_many(cache_key, new)
+            found.update(new)
+        return np.stack([found[h] for h in hashes])
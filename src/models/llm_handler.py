@@ -1,31 +1,66 @@
-from llama_cpp import Llama
+import re
+import threading
+import time
 import config
 import streamlit as st
+from models.backends.base import create_backend
+from models.context_window import ContextWindowManager
+from models.prompt_cache import PromptStateCache, longest_common_prefix
+from models.worker_pool import LLMWorkerPool
+from rag.compaction import compact_context
+from utils.monitoring import (
+    TIME_TO_FIRST_TOKEN, INTER_TOKEN_LATENCY, TOKENS_PER_SECOND,
+    PROMPT_CACHE_HITS, PROMPT_CACHE_MISSES, PROMPT_CACHE_TOKENS_REUSED,
+    PROMPT_SECTION_TOKENS, PROMPT_SECTION_TRIMMED, SPECULATIVE_ACCEPTANCE
+)
 
 class LLMHandler:
-    def __init__(self):
+    def __init__(self, n_threads=None, use_pool=None, prompt_cache_dir=None):
         self.model = None
-    
+        self.pool = None
+        self.load_lock = threading.Lock()
+        self.n_threads = n_threads
+        self.use_pool = config.LLM_WORKERS > 0 if use_pool is None else use_pool
+        self.context_window = None
+        self.active_chat_id = None
+        self.prompt_cache = None
+        self.decoding_mode = config.SPECULATIVE_MODE
+        if config.PROMPT_CACHE_ENABLED:
+            self.prompt_cache = PromptStateCache(
+                spill_dir=(prompt_cache_dir or config.PROMPT_CACHE_DIR) if config.PROMPT_CACHE_SPILL_TO_DISK else None
+            )
+
     def load_model(self):
-        if self.model is not None: return
-        print(f"🚀 Loading GGUF: {config.MODEL_ID}")
+        # The background warm-up and the first request may race to get here
+        with self.load_lock:
+            if self.model is None: self._load_model()
+
+    def _load_model(self):
+        if self.use_pool:
+            # Generation happens in the worker processes; this process only
+            # needs the vocabulary to count and trim prompt tokens
+            self.model = create_backend(vocab_only=True)
+            self.context_window = ContextWindowManager(self.model)
+            self.pool = LLMWorkerPool()
+            self.pool.start()
+            return
+        print(f"🚀 Loading {config.LLM_BACKEND} backend: {config.MODEL_ID}")
         try:
-            self.model = Llama(
-                model_path=str(config.MODEL_ID),
-                n_ctx=4096,
-                n_gpu_layers=-1,
-                verbose=True
-            )
-            print("✅ Model loaded on GPU!")
+            self.model = create_backend(n_threads=self.n_threads, decoding_mode=self.decoding_mode)
+            self.context_window = ContextWindowManager(self.model, n_ctx=self.model.n_ctx())
+            print("✅ Model loaded!")
         except Exception as e:
             print(f"❌ Load Error: {e}")
             raise e
 
-    def generate_response(self, input_data, max_new_tokens=None):
-        if self.model is None: self.load_model()
-        max_tokens = max_new_tokens or config.MAX_NEW_TOKENS
-        
-        # Construct Prompt
+    def set_decoding_mode(self, mode):
+        """Switch between 'off', 'prompt_lookup' and 'draft_model' speculative decoding"""
+        self.decoding_mode = mode
+        if self.model is None or self.pool is not None: return
+        self.model.set_decoding_mode(mode)
+
+    def build_prompt(self, input_data):
+        """Turn a single prompt or a chat history into the [INST] transcript"""
         prompt_text = ""
         if isinstance(input_data, str):
             prompt_text = f"[INST] {input_data} [/INST]"
@@ -35,31 +70,156 @@ class LLMHandler:
                     prompt_text += f"[INST] {msg['content']} [/INST]"
                 elif msg['role'] == 'assistant':
                     prompt_text += f" {msg['content']} </s>"
+        return prompt_text
 
-        # Inference
-        output = self.model(
-            prompt_text,
-            max_tokens=max_tokens,
-            temperature=config.TEMPERATURE,
-            stop=["</s>", "[/INST]"],
-            echo=False
-        )
-        return output['choices'][0]['text'].strip()
+    def generation_params(self):
+        """Everything besides the prompt that shapes a response"""
+        return {
+            'backend': config.LLM_BACKEND, 'model': str(config.MODEL_ID), 'max_new_tokens': config.MAX_NEW_TOKENS,
+            'temperature': config.TEMPERATURE, 'top_p': config.TOP_P
+        }
+
+    def fit_prompt(self, input_data, max_tokens):
+        """Build the prompt text, trimmed so that it plus max_tokens fits the context window"""
+        budget = self.context_window.prompt_budget(max_tokens)
+        if isinstance(input_data, str):
+            overhead = self.context_window.count(self.build_prompt(""))
+            if self.context_window.count(input_data) + overhead > budget:
+                input_data = self.context_window.truncate(input_data, budget - overhead)
+                PROMPT_SECTION_TRIMMED.labels(section="prompt").inc()
+            return self.build_prompt(input_data)
+        return self.build_prompt(self.context_window.fit_history(input_data, budget, self.build_prompt))
+
+    def restore_prefix(self, chat_id, prompt_text):
+        """Put the model back into the evaluated state of chat_id so the backend only prefills the new turn.
+
+        Returns (cache tier or None on a miss, prompt tokens reused).
+        """
+        if self.active_chat_id == chat_id:
+            tier = "active"
+        else:
+            state, tier = self.prompt_cache.get(chat_id)
+            if state is not None: self.model.load_state(state)
+        if tier is None: return None, 0
+
+        prompt_tokens = self.model.tokenize(prompt_text, add_bos=True)
+        return tier, longest_common_prefix(self.model.evaluated_tokens(), prompt_tokens)
+
+    def completion_stream(self, prompt_text, max_tokens, chat_id=None, stats=None):
+        """Run the backend on an already fitted prompt, yielding text pieces.
+
+        Cache and draft-model counters are written into stats so that the
+        caller (possibly in another process) can export them.
+        """
+        if self.pool is not None:
+            yield from self.pool.stream(prompt_text, max_tokens, chat_id, stats)
+            return
+
+        stats = stats if stats is not None else {}
+        stats['n_tokens'] = 0
+        use_cache = chat_id is not None and self.prompt_cache is not None
+        if use_cache: stats['cache_tier'], stats['tokens_reused'] = self.restore_prefix(chat_id, prompt_text)
+        self.active_chat_id = chat_id if use_cache else None
+
+        draft_model = self.model.draft_model
+        draft_before = draft_model.snapshot() if draft_model else None
+        stream = self.model.stream(prompt_text, max_tokens, config.TEMPERATURE, stop=["</s>", "[/INST]"])
+        try:
+            for piece in stream:
+                stats['n_tokens'] += 1
+                yield piece
+        finally:
+            if use_cache: self.prompt_cache.put(chat_id, self.model.save_state())
+            if draft_before is not None:
+                from models.speculative import acceptance_rate
+                stats['acceptance'] = acceptance_rate(draft_before, draft_model.snapshot(), stats['n_tokens'])
+            stats['decoding'] = self.model.decoding_mode
+
+    def stream_response(self, input_data, max_new_tokens=None, chat_id=None):
+        """Yield response text piece by piece as the backend decodes it.
+
+        Passing chat_id reuses the evaluated prompt prefix of earlier turns of that chat.
+        """
+        if self.model is None: self.load_model()
+        max_tokens = max_new_tokens or config.MAX_NEW_TOKENS
+        prompt_text = self.fit_prompt(input_data, max_tokens)
+        prompt_tokens = self.context_window.count(prompt_text)
+        PROMPT_SECTION_TOKENS.labels(section="total").observe(prompt_tokens)
+        max_tokens = min(max_tokens, self.context_window.n_ctx - prompt_tokens - 1)
+
+        start_time = time.time()
+        first_token_time = last_token_time = None
+        n_pieces = 0
+        stats = {}
+        for piece in self.completion_stream(prompt_text, max_tokens, chat_id, stats):
+            now = time.time()
+            if first_token_time is None:
+                first_token_time = now
+                TIME_TO_FIRST_TOKEN.observe(now - start_time)
+            else: INTER_TOKEN_LATENCY.observe(now - last_token_time)
+            last_token_time = now
+            n_pieces += 1
+            if piece: yield piece
+
+        decoding = stats.get('decoding', self.decoding_mode)
+        # Decode rate excludes prefill, so it is measured from the first token
+        if n_pieces > 1:
+            TOKENS_PER_SECOND.labels(decoding=decoding).observe(
+                (n_pieces - 1) / max(last_token_time - first_token_time, 1e-6)
+            )
+        if stats.get('acceptance') is not None:
+            SPECULATIVE_ACCEPTANCE.labels(decoding=decoding).observe(stats['acceptance'])
+        if 'cache_tier' in stats:
+            if stats['cache_tier'] is None: PROMPT_CACHE_MISSES.inc()
+            else:
+                PROMPT_CACHE_HITS.labels(tier=stats['cache_tier']).inc()
+                PROMPT_CACHE_TOKENS_REUSED.inc(stats['tokens_reused'])
+
+    def generate_response(self, input_data, max_new_tokens=None):
+        return "".join(self.stream_response(input_data, max_new_tokens)).strip()
+
+    def rag_prompt(self, query, context, max_new_tokens=None, metadatas=None):
+        """Build the RAG prompt, fitting retrieved chunks (best first) into the leftover budget.
+
+        With the chunks' metadatas, overlapping chunks are merged first and
+        the kept spans are put back in document order.
+        """
+        if self.model is None: self.load_model()
+        chunks = [context] if isinstance(context, str) else list(context)
+        skeleton = self.build_prompt(f"Context:\n\n\nQuestion: {query}")
+        budget = self.context_window.prompt_budget(max_new_tokens or config.MAX_NEW_TOKENS) - self.context_window.count(skeleton)
+        fit = lambda texts: self.context_window.fit_chunks(texts, budget)
+        if metadatas is not None and config.CONTEXT_COMPACTION:
+            kept = compact_context(chunks, metadatas, fit, self.context_window.count)
+        else:
+            kept = fit(chunks)
+        context = "\n\n".join(kept)
+        return f"Context:\n{context}\n\nQuestion: {query}"
+
+    def generate_rag_response(self, query, context, metadatas=None):
+        return self.generate_response(self.rag_prompt(query, context, metadatas=metadatas))
+
+    def stream_rag_response(self, query, context, metadatas=None):
+        return self.stream_response(self.rag_prompt(query, context, metadatas=metadatas))
 
-    def generate_rag_response(self, query, context):
-        return self.generate_response(f"Context:\n{context}\n\nQuestion: {query}")
-    
     def generate_socratic_question(self, context, history, question):
         return self.generate_response(f"Context: {context}\nStudent: {question}\nAsk a guiding question.")
-        
+
     def generate_final_explanation(self, context, history, answer):
         return self.generate_response(f"Context: {context}\nAnswer: {answer}\nValidate and explain.")
 
     def generate_qa_for_batch(self, chunks):
-        return [self.generate_response(f"Create a Q&A pair from:\n{c}") for c in chunks]
+        """Create one Q&A pair per chunk with a single prompt for the whole batch"""
+        excerpts = "\n\n".join(f"Excerpt {i}:\n{c}" for i, c in enumerate(chunks, 1))
+        prompt = (
+            f"{excerpts}\n\nCreate exactly one question and answer pair for each of the "
+            f"{len(chunks)} excerpts above. Use the format:\nQ1: ...\nA1: ...\nQ2: ...\nA2: ..."
+        )
+        text = self.generate_response(prompt, max_new_tokens=config.STUDY_GUIDE_TOKENS_PER_PAIR * len(chunks))
+        pairs = [p.strip() for p in re.split(r"\n(?=Q\d+:)", "\n" + text) if p.strip()]
+        return pairs or [text]
 
 @st.cache_resource(show_spinner=False)
 def get_llm_handler():
-    handler = LLMHandler()
-    handler.load_model()
-    return handler
\ No newline at end of file
+    """Shared handler; the model itself is loaded by the background warm-up or on first use"""
+    return LLMHandler()
@@ -0,0 +1,110 @@
+"""ONNX Runtime backend for the sentence embedding model.
+
+The model is exported once (needs torch and transformers) to
+EMBEDDING_ONNX_DIR and optionally int8-quantized; serving then only needs
+onnxruntime and tokenizers. Export ahead of time with:
+
+    python src/models/onnx_embeddings.py
+"""
+import inspect
+import sys
+from pathlib import Path
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+import config
+
+def artifact_dir():
+    return config.EMBEDDING_ONNX_DIR / config.EMBEDDING_MODEL.replace("/", "--")
+
+def model_filename(quantize):
+    return "model_int8.onnx" if quantize else "model.onnx"
+
+def export_onnx_model(quantize=None):
+    """Export EMBEDDING_MODEL's transformer to ONNX next to its tokenizer; returns the model path"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    quantize = config.EMBEDDING_ONNX_QUANTIZE if quantize is None else quantize
+    out_dir = artifact_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = out_dir / model_filename(False)
+
+    if not fp32_path.exists():
+        print(f"📦 Exporting {config.EMBEDDING_MODEL} to ONNX: {out_dir}")
+        tokenizer = AutoTokenizer.from_pretrained(config.EMBEDDING_MODEL, cache_dir=str(config.EMBEDDING_CACHE))
+        model = AutoModel.from_pretrained(config.EMBEDDING_MODEL, cache_dir=str(config.EMBEDDING_CACHE)).eval()
+        sample = tokenizer(["export"], return_tensors="pt")
+        # Positional export args must follow forward()'s order, not the tokenizer's
+        input_names = [name for name in inspect.signature(model.forward).parameters if name in sample]
+        axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(sample[name] for name in input_names), str(fp32_path),
+                input_names=input_names, output_names=["last_hidden_state"],
+                dynamic_axes=axes, opset_version=14
+            )
+        tokenizer.save_pretrained(str(out_dir))
+
+    if not quantize: return fp32_path
+    int8_path = out_dir / model_filename(True)
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print("📦 Quantizing ONNX embedding model to int8")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+class OnnxEmbeddingModel:
+    """Mean-pooled, L2-normalized sentence embeddings from an ONNX Runtime session.
+
+    Mirrors the SentenceTransformer.encode call EmbeddingHandler makes, so
+    either can sit behind the handler.
+    """
+
+    def __init__(self, model_path, tokenizer_path, max_seq_length=None, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        options = ort.SessionOptions()
+        if threads: options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_seq_length or config.EMBEDDING_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+    @classmethod
+    def load(cls, quantize=None):
+        """Load the cached export, exporting first if it is missing"""
+        quantize = config.EMBEDDING_ONNX_QUANTIZE if quantize is None else quantize
+        model_path = artifact_dir() / model_filename(quantize)
+        if not model_path.exists(): model_path = export_onnx_model(quantize)
+        return cls(model_path, artifact_dir() / "tokenizer.json")
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        mask = feeds['attention_mask'][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str): return self.encode([texts], batch_size)[0]
+        if not texts: return np.zeros((0, self.session.get_outputs()[0].shape[-1] or 0), dtype=np.float32)
+        # Longest first so each batch pads to similar lengths, as sentence-transformers does
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        embeddings = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            batch = self._encode_batch([texts[i] for i in idx])
+            if embeddings.shape[1] == 0: embeddings = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            embeddings[idx] = batch
+        return embeddings
+
+if __name__ == "__main__":
+    print(f"✅ Exported: {export_onnx_model()}")
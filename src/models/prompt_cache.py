@@ -0,0 +1,72 @@
+import pickle
+import re
+import threading
+from collections import OrderedDict
+import config
+
+class PromptStateCache:
+    """Bounded LRU of evaluated llama.cpp states keyed by chat id, spilling evictions to disk"""
+
+    def __init__(self, max_states=None, spill_dir=None, max_disk_states=None):
+        self.max_states = max_states or config.PROMPT_CACHE_MAX_STATES
+        self.spill_dir = spill_dir
+        self.max_disk_states = max_disk_states or config.PROMPT_CACHE_MAX_DISK_STATES
+        self.states = OrderedDict()
+        self.lock = threading.Lock()
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def _spill_path(self, key):
+        return self.spill_dir / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.state"
+
+    def get(self, key):
+        """Return (state, tier) where tier is 'memory', 'disk' or None on a miss"""
+        with self.lock:
+            if key in self.states:
+                self.states.move_to_end(key)
+                return self.states[key], "memory"
+
+        if self.spill_dir is None: return None, None
+        path = self._spill_path(key)
+        if not path.exists(): return None, None
+        try:
+            with open(path, "rb") as f: state = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ Dropping unreadable prompt state {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None, None
+        path.unlink(missing_ok=True)
+        self.put(key, state)
+        return state, "disk"
+
+    def put(self, key, state):
+        evicted = []
+        with self.lock:
+            self.states[key] = state
+            self.states.move_to_end(key)
+            while len(self.states) > self.max_states:
+                evicted.append(self.states.popitem(last=False))
+        for old_key, old_state in evicted:
+            self._spill(old_key, old_state)
+
+    def _spill(self, key, state):
+        if self.spill_dir is None: return
+        try:
+            with open(self._spill_path(key), "wb") as f: pickle.dump(state, f)
+        except Exception as e:
+            print(f"⚠️ Could not spill prompt state for {key}: {e}")
+            return
+        spilled = sorted(self.spill_dir.glob("*.state"), key=lambda p: p.stat().st_mtime)
+        for path in spilled[:max(0, len(spilled) - self.max_disk_states)]:
+            path.unlink(missing_ok=True)
+
+    def discard(self, key):
+        with self.lock: self.states.pop(key, None)
+        if self.spill_dir is not None: self._spill_path(key).unlink(missing_ok=True)
+
+def longest_common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y: break
+        n += 1
+    return n
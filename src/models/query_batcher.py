@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import config
+import streamlit as st
+from models.embeddings import EmbeddingHandler
+from utils.monitoring import QUERY_EMBED_BATCH_SIZE, QUERY_EMBED_QUEUE_WAIT, QUERY_EMBED_CACHE_LOOKUPS
+
+class QueryEmbeddingBatcher:
+    """Encodes query strings from all sessions in shared micro-batches.
+
+    A request waits at most max_wait_ms for others to join its batch, so
+    concurrent users share one forward pass instead of each running a
+    batch of one. Recent queries are answered from an LRU without encoding,
+    and identical queries in flight share one slot in the batch.
+    """
+
+    def __init__(self, embedding_handler=None, max_batch_size=None, max_wait_ms=None, cache_size=None):
+        self.embedding_handler = embedding_handler or EmbeddingHandler()
+        self.max_batch_size = max_batch_size or config.QUERY_BATCH_MAX_SIZE
+        self.max_wait = (max_wait_ms or config.QUERY_BATCH_MAX_WAIT_MS) / 1000
+        self.cache_size = cache_size or config.QUERY_EMBEDDING_CACHE_SIZE
+        self.cache = OrderedDict()
+        self.pending = OrderedDict()
+        self.cond = threading.Condition()
+        threading.Thread(target=self._worker, name="query-embedding-batcher", daemon=True).start()
+
+    def embed(self, text):
+        """Return the float32 embedding of one query string"""
+        with self.cond:
+            if text in self.cache:
+                self.cache.move_to_end(text)
+                QUERY_EMBED_CACHE_LOOKUPS.labels(result="hit").inc()
+                return self.cache[text]
+            QUERY_EMBED_CACHE_LOOKUPS.labels(result="miss").inc()
+            if text not in self.pending:
+                self.pending[text] = (Future(), time.time())
+                self.cond.notify()
+            future = self.pending[text][0]
+        return future.result()
+
+    def embed_many(self, texts):
+        """Embeddings of several queries from one caller, as a (len(texts), dim) array.
+
+        The caller already has a batch, so misses are encoded together right
+        away instead of going through the queue.
+        """
+        if len(texts) == 1: return np.asarray([self.embed(texts[0])])
+        with self.cond:
+            found = {t: self.cache[t] for t in texts if t in self.cache}
+            for t in found: self.cache.move_to_end(t)
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        QUERY_EMBED_CACHE_LOOKUPS.labels(result="hit").inc(len(texts) - len(missing))
+        QUERY_EMBED_CACHE_LOOKUPS.labels(result="miss").inc(len(missing))
+        if missing:
+            QUERY_EMBED_BATCH_SIZE.observe(len(missing))
+            embeddings = np.asarray(self.embedding_handler.get_embeddings(missing), dtype=np.float32)
+            found.update(zip(missing, embeddings))
+            with self.cond:
+                for text, embedding in zip(missing, embeddings):
+                    self.cache[text] = embedding
+                while len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+        return np.stack([found[t] for t in texts])
+
+    def _take_batch(self):
+        """Block for the first request, then gather more until the batch is full or max_wait has passed"""
+        with self.cond:
+            while not self.pending: self.cond.wait()
+            deadline = time.time() + self.max_wait
+            while len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0: break
+                self.cond.wait(remaining)
+            batch = []
+            while self.pending and len(batch) < self.max_batch_size:
+                batch.append(self.pending.popitem(last=False))
+            return batch
+
+    def _worker(self):
+        while True:
+            batch = self._take_batch()
+            now = time.time()
+            for _, (_, enqueued_at) in batch: QUERY_EMBED_QUEUE_WAIT.observe(now - enqueued_at)
+            QUERY_EMBED_BATCH_SIZE.observe(len(batch))
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = np.asarray(self.embedding_handler.get_embeddings(texts), dtype=np.float32)
+            except Exception as e:
+                for _, (future, _) in batch: future.set_exception(e)
+                continue
+
+            with self.cond:
+                for text, embedding in zip(texts, embeddings):
+                    self.cache[text] = embedding
+                    self.cache.move_to_end(text)
+                while len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+            for (_, (future, _)), embedding in zip(batch, embeddings): future.set_result(embedding)
+
+@st.cache_resource(show_spinner=False)
+def get_query_batcher():
+    """One batcher per process, shared by every session's retrieval and response-cache lookups"""
+    return QueryEmbeddingBatcher()
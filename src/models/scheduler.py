@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+import config
+import streamlit as st
+from utils.monitoring import SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS, SCHEDULER_REJECTIONS
+
+class Priority(IntEnum):
+    """Lower value is served first"""
+    INTERACTIVE = 0
+    BATCH = 1
+    BACKGROUND = 2
+
+class SchedulerFullError(RuntimeError):
+    pass
+
+class RequestTimeoutError(TimeoutError):
+    pass
+
+class InferenceRequest:
+    """Handle for a queued call; iterate it for streamed pieces or call result()"""
+
+    def __init__(self, func, args, kwargs, user_id, priority, timeout, stream):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.user_id = user_id
+        self.priority = priority
+        self.stream = stream
+        self.enqueued_at = time.time()
+        self.deadline = self.enqueued_at + timeout
+        self.cancelled = threading.Event()
+        self.started = threading.Event()
+        self.timed_out = False
+        self.events = queue.Queue()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _wait_started(self):
+        if self.started.wait(max(0, self.deadline - time.time())): return
+        self.timed_out = True
+        self.cancel()
+        SCHEDULER_REJECTIONS.labels(reason="timeout").inc()
+        raise RequestTimeoutError("Timed out waiting for the model, please try again.")
+
+    def __iter__(self):
+        try:
+            self._wait_started()
+            while True:
+                kind, value = self.events.get()
+                if kind == "token": yield value
+                elif kind == "error": raise value
+                else: return
+        finally:
+            # Reached on normal completion too, where cancelling is a no-op
+            self.cancel()
+
+    def result(self):
+        self._wait_started()
+        while True:
+            kind, value = self.events.get()
+            if kind == "error": raise value
+            if kind == "done": return value
+
+class InferenceScheduler:
+    """Serializes access to the shared LLMHandler.
+
+    Requests are served strictly by priority; within a priority, users are
+    served round-robin so one user's burst cannot starve the others.
+    """
+
+    def __init__(self, max_queue=None, max_per_user=None, concurrency=1):
+        self.max_queue = max_queue or config.SCHEDULER_MAX_QUEUE
+        self.max_per_user = max_per_user or config.SCHEDULER_MAX_PER_USER
+        self.queues = {p: OrderedDict() for p in Priority}
+        self.size = 0
+        self.cond = threading.Condition()
+        for i in range(concurrency):
+            threading.Thread(target=self._worker, name=f"inference-worker-{i}", daemon=True).start()
+
+    def submit(self, func, *args, user_id=None, priority=Priority.INTERACTIVE, timeout=None, stream=False, **kwargs):
+        request = InferenceRequest(func, args, kwargs, user_id, priority,
+                                   timeout or config.SCHEDULER_QUEUE_TIMEOUT, stream)
+        with self.cond:
+            user_queue = self.queues[priority].get(user_id)
+            if self.size >= self.max_queue:
+                SCHEDULER_REJECTIONS.labels(reason="queue_full").inc()
+                raise SchedulerFullError("The tutor is busy right now, please try again in a moment.")
+            if user_queue is not None and len(user_queue) >= self.max_per_user:
+                SCHEDULER_REJECTIONS.labels(reason="user_limit").inc()
+                raise SchedulerFullError("You already have several requests running, please wait for them to finish.")
+            self.queues[priority].setdefault(user_id, deque()).append(request)
+            self.size += 1
+            SCHEDULER_QUEUE_DEPTH.labels(priority=priority.name.lower()).inc()
+            self.cond.notify()
+        return request
+
+    def stream(self, func, *args, **kwargs):
+        return iter(self.submit(func, *args, stream=True, **kwargs))
+
+    def run(self, func, *args, **kwargs):
+        return self.submit(func, *args, **kwargs).result()
+
+    def _next_request(self):
+        for priority in Priority:
+            users = self.queues[priority]
+            if not users: continue
+            user_id, user_queue = next(iter(users.items()))
+            request = user_queue.popleft()
+            # Rotate the user to the back so the next pick goes to someone else
+            del users[user_id]
+            if user_queue: users[user_id] = user_queue
+            self.size -= 1
+            SCHEDULER_QUEUE_DEPTH.labels(priority=priority.name.lower()).dec()
+            return request
+        return None
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                request = self._next_request()
+                while request is None:
+                    self.cond.wait()
+                    request = self._next_request()
+            self._execute(request)
+
+    def _execute(self, request):
+        if request.cancelled.is_set():
+            if not request.timed_out: SCHEDULER_REJECTIONS.labels(reason="cancelled").inc()
+            return
+        request.started.set()
+        SCHEDULER_WAIT_SECONDS.labels(priority=request.priority.name.lower()).observe(time.time() - request.enqueued_at)
+
+        try:
+            if request.stream:
+                pieces = request.func(*request.args, **request.kwargs)
+                try:
+                    for piece in pieces:
+                        if request.cancelled.is_set(): break
+                        request.events.put(("token", piece))
+                finally:
+                    pieces.close()
+                request.events.put(("done", None))
+            else:
+                request.events.put(("done", request.func(*request.args, **request.kwargs)))
+        except Exception as e:
+            request.events.put(("error", e))
+
+@st.cache_resource(show_spinner=False)
+def get_inference_scheduler():
+    # With a worker pool, one request per worker can decode at the same time
+    return InferenceScheduler(concurrency=max(1, config.LLM_WORKERS))
@@ -0,0 +1,69 @@
+import numpy as np
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+import config
+
+class GGUFDraftModel(LlamaDraftModel):
+    """Drafts tokens greedily with a small GGUF model that shares the main model's vocabulary"""
+
+    def __init__(self, model_path, num_pred_tokens=None):
+        self.num_pred_tokens = num_pred_tokens or config.SPECULATIVE_NUM_PRED_TOKENS
+        print(f"🚀 Loading draft GGUF: {model_path}")
+        self.model = Llama(
+            model_path=str(model_path),
+            n_ctx=config.LLM_CONTEXT_WINDOW,
+            n_gpu_layers=config.DRAFT_GPU_LAYERS,
+            verbose=False
+        )
+
+    def __call__(self, input_ids, /, **kwargs):
+        draft = []
+        # generate() keeps the longest common prefix evaluated, so each call
+        # only prefills the tokens the main model accepted since last time
+        for token in self.model.generate(input_ids.tolist(), temp=0.0, reset=True):
+            draft.append(token)
+            if len(draft) >= self.num_pred_tokens or token == self.model.token_eos(): break
+        return np.array(draft, dtype=np.intc)
+
+class TrackedDraftModel(LlamaDraftModel):
+    """Counts how often a draft model is consulted and how many tokens it proposes"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = 0
+        self.proposed = 0
+
+    def __call__(self, input_ids, /, **kwargs):
+        draft = self.inner(input_ids, **kwargs)
+        self.calls += 1
+        self.proposed += len(draft)
+        return draft
+
+    def snapshot(self):
+        return self.calls, self.proposed
+
+def acceptance_rate(before, after, n_generated):
+    """Estimate the share of drafted tokens the main model accepted.
+
+    llama.cpp does not report acceptance, but every draft call is followed
+    by one evaluation that yields one sampled token plus the accepted
+    drafts, and the prompt evaluation yields the first token. So
+    accepted = generated - 1 - draft calls.
+    """
+    calls = after[0] - before[0]
+    proposed = after[1] - before[1]
+    if proposed <= 0: return None
+    accepted = max(0, n_generated - 1 - calls)
+    return min(1.0, accepted / proposed)
+
+def build_draft_model(mode):
+    if mode == "prompt_lookup":
+        return TrackedDraftModel(LlamaPromptLookupDecoding(
+            max_ngram_size=config.SPECULATIVE_MAX_NGRAM,
+            num_pred_tokens=config.SPECULATIVE_NUM_PRED_TOKENS
+        ))
+    if mode == "draft_model":
+        return TrackedDraftModel(GGUFDraftModel(config.DRAFT_MODEL_ID))
+    if mode == "off":
+        return None
+    raise ValueError(f"Unknown speculative decoding mode: {mode}")
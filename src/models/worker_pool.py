@@ -0,0 +1,190 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+import config
+from utils.monitoring import LLM_WORKERS_ALIVE, LLM_WORKER_RESTARTS, LLM_WORKER_IN_FLIGHT
+
+def _worker_main(conn, n_threads, index):
+    """Entry point of a worker process: one local LLMHandler serving one request at a time"""
+    from models.llm_handler import LLMHandler
+    # Each worker prunes its spill directory to its own budget, so they must not share one
+    handler = LLMHandler(n_threads=n_threads, use_pool=False, prompt_cache_dir=config.PROMPT_CACHE_DIR / f"worker-{index}")
+    handler.load_model()
+    conn.send(("ready", None, None))
+
+    while True:
+        try: kind, request_id, payload = conn.recv()
+        except EOFError: return
+        if kind == "ping":
+            conn.send(("pong", request_id, None))
+        elif kind == "generate":
+            stats = {}
+            try:
+                for piece in handler.completion_stream(stats=stats, **payload):
+                    conn.send(("token", request_id, piece))
+                    # The parent sends "cancel" when its reader goes away
+                    if conn.poll() and conn.recv()[0] == "cancel": break
+                conn.send(("done", request_id, stats))
+            except Exception as e:
+                conn.send(("error", request_id, f"{type(e).__name__}: {e}"))
+
+class WorkerHandle:
+    def __init__(self, index, ctx, n_threads):
+        self.index = index
+        self.ctx = ctx
+        self.n_threads = n_threads
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.last_chat_id = None
+        self.process = None
+        self.conn = None
+        self.next_id = 0
+        self.ready = False
+
+    def spawn(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main, args=(child_conn, self.n_threads, self.index),
+            name=f"llm-worker-{self.index}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.last_chat_id = None
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout): raise TimeoutError(f"llm-worker-{self.index} did not load in {timeout}s")
+        try: kind, _, _ = self.conn.recv()
+        except EOFError: kind = None
+        if kind != "ready": raise RuntimeError(f"llm-worker-{self.index} failed to start")
+        self.ready = True
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def kill(self):
+        self.ready = False
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        if self.conn is not None: self.conn.close()
+
+class LLMWorkerPool:
+    """N llama.cpp worker processes behind pipes, dispatched least-loaded.
+
+    Each worker loads the GGUF with mmap, so the weights sit once in the
+    page cache and are shared read-only by all workers. A monitor thread
+    pings idle workers and restarts any that died or stopped answering.
+    """
+
+    def __init__(self, n_workers=None, n_threads=None):
+        self.n_workers = n_workers or config.LLM_WORKERS
+        self.n_threads = n_threads or config.LLM_WORKER_THREADS or max(1, (os.cpu_count() or 1) // self.n_workers)
+        self.ctx = mp.get_context("spawn")
+        self.workers = [WorkerHandle(i, self.ctx, self.n_threads) for i in range(self.n_workers)]
+        self.dispatch_lock = threading.Lock()
+        self.monitor = None
+
+    def start(self):
+        print(f"🚀 Starting {self.n_workers} LLM workers with {self.n_threads} threads each")
+        for worker in self.workers: worker.spawn()
+        for worker in self.workers: worker.wait_ready(config.LLM_WORKER_START_TIMEOUT)
+        LLM_WORKERS_ALIVE.set(self.n_workers)
+        self.monitor = threading.Thread(target=self._monitor, name="llm-worker-monitor", daemon=True)
+        self.monitor.start()
+        print("✅ LLM workers ready!")
+
+    def _pick_worker(self, chat_id):
+        """Least in-flight wins; among equals prefer the worker that already holds this chat's prefix"""
+        with self.dispatch_lock:
+            # Workers the monitor is still reloading are skipped rather than waited for
+            candidates = [w for w in self.workers if w.ready and w.alive()]
+            if not candidates: raise RuntimeError("No LLM worker is available")
+            worker = min(candidates, key=lambda w: (w.in_flight, chat_id is None or w.last_chat_id != chat_id))
+            worker.in_flight += 1
+            LLM_WORKER_IN_FLIGHT.labels(worker=str(worker.index)).set(worker.in_flight)
+            return worker
+
+    def stream(self, prompt_text, max_tokens, chat_id=None, stats=None):
+        worker = self._pick_worker(chat_id)
+        try:
+            with worker.lock:
+                worker.last_chat_id = chat_id
+                worker.next_id += 1
+                request_id = worker.next_id
+                payload = {'prompt_text': prompt_text, 'max_tokens': max_tokens, 'chat_id': chat_id}
+                try: worker.conn.send(("generate", request_id, payload))
+                except OSError:
+                    self._retire(worker)
+                    raise RuntimeError(f"llm-worker-{worker.index} is not responding, please try again.")
+                finished = False
+                try:
+                    while True:
+                        try: kind, rid, value = worker.conn.recv()
+                        except (EOFError, OSError):
+                            finished = True
+                            self._retire(worker)
+                            raise RuntimeError(f"llm-worker-{worker.index} crashed during generation")
+                        if rid != request_id: continue
+                        if kind == "token": yield value
+                        elif kind == "error":
+                            finished = True
+                            raise RuntimeError(value)
+                        else:
+                            finished = True
+                            if stats is not None: stats.update(value)
+                            return
+                finally:
+                    if not finished: self._cancel(worker, request_id)
+        finally:
+            with self.dispatch_lock:
+                worker.in_flight -= 1
+                LLM_WORKER_IN_FLIGHT.labels(worker=str(worker.index)).set(worker.in_flight)
+
+    def _cancel(self, worker, request_id):
+        """Tell the worker to stop and drain its pipe so the next request starts clean"""
+        try:
+            worker.conn.send(("cancel", request_id, None))
+            while True:
+                kind, rid, _ = worker.conn.recv()
+                if rid == request_id and kind in ("done", "error"): return
+        except (EOFError, OSError):
+            self._retire(worker)
+
+    def _retire(self, worker):
+        """Take a broken worker out of dispatch without waiting for a reload; the monitor respawns it"""
+        worker.kill()
+        LLM_WORKERS_ALIVE.set(sum(w.alive() for w in self.workers))
+
+    def _restart(self, worker):
+        print(f"⚠️ Restarting llm-worker-{worker.index}")
+        LLM_WORKER_RESTARTS.inc()
+        worker.kill()
+        LLM_WORKERS_ALIVE.set(sum(w.alive() for w in self.workers))
+        worker.spawn()
+        worker.wait_ready(config.LLM_WORKER_START_TIMEOUT)
+        LLM_WORKERS_ALIVE.set(sum(w.alive() for w in self.workers))
+
+    def _health_check(self, worker):
+        """Ping an idle worker; busy ones are only checked for being alive"""
+        if not worker.alive(): return False
+        if not worker.lock.acquire(blocking=False): return True
+        try:
+            worker.conn.send(("ping", 0, None))
+            if not worker.conn.poll(config.LLM_WORKER_PING_TIMEOUT): return False
+            return worker.conn.recv()[0] == "pong"
+        except (EOFError, OSError):
+            return False
+        finally:
+            worker.lock.release()
+
+    def _monitor(self):
+        while True:
+            time.sleep(config.LLM_WORKER_HEALTH_INTERVAL)
+            for worker in self.workers:
+                if self._health_check(worker): continue
+                with worker.lock:
+                    try: self._restart(worker)
+                    except Exception as e: print(f"❌ Could not restart llm-worker-{worker.index}: {e}")
+            LLM_WORKERS_ALIVE.set(sum(w.alive() for w in self.workers))
@@ -0,0 +1,71 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+import config
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+class BM25Index:
+    """Okapi BM25 over one collection's chunks, stored as term -> [(chunk, term frequency)] postings.
+
+    Built at ingest and saved as JSON next to the Chroma data; a query only
+    touches the postings of its own terms.
+    """
+
+    def __init__(self, ids, doc_lens, postings, k1=None, b=None):
+        self.ids = ids
+        self.doc_lens = doc_lens
+        self.postings = postings
+        self.k1 = k1 or config.BM25_K1
+        self.b = b if b is not None else config.BM25_B
+        self.avg_len = sum(doc_lens) / len(doc_lens) if doc_lens else 0.0
+
+    @classmethod
+    def build(cls, ids, documents):
+        postings = defaultdict(list)
+        doc_lens = []
+        for i, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items(): postings[term].append((i, tf))
+        return cls(list(ids), doc_lens, dict(postings))
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({'ids': self.ids, 'doc_lens': self.doc_lens, 'postings': self.postings}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f: data = json.load(f)
+        return cls(data['ids'], data['doc_lens'], data['postings'])
+
+    def search(self, query, top_k):
+        """Return [(chunk id, score)] for the best top_k chunks containing any query term"""
+        n = len(self.ids)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            entries = self.postings.get(term)
+            if not entries: continue
+            idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            for i, tf in entries:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[i] / self.avg_len)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        return [(self.ids[i], score) for i, score in best]
+
+def reciprocal_rank_fusion(rankings, top_k, k=None):
+    """Fuse ranked id lists: each list adds 1 / (k + rank) to every id it contains"""
+    k = k or config.RRF_K
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1): scores[chunk_id] += 1 / (k + rank)
+    return sorted(scores, key=lambda chunk_id: -scores[chunk_id])[:top_k]
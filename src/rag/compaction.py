@@ -0,0 +1,52 @@
+from utils.monitoring import CONTEXT_COMPACTION_TOKENS
+
+# Chunks are whitespace-stripped, so neighbours can be a character or two apart
+MAX_GAP = 2
+
+def merge_chunks(documents, metadatas):
+    """Merge retrieved chunks that overlap or touch in the source text.
+
+    Returns spans as (text, start_index, rank) in rank order, where a merged
+    span takes the best rank of its chunks. Chunks without a start_index
+    (indexed before offsets were stored) stay as they are.
+    """
+    positioned, loose = [], []
+    for rank, (text, metadata) in enumerate(zip(documents, metadatas or [None] * len(documents))):
+        start = (metadata or {}).get("start_index")
+        if start is None or start < 0: loose.append((text, None, rank))
+        else: positioned.append((text, start, rank))
+
+    spans = []
+    for text, start, rank in sorted(positioned, key=lambda span: span[1]):
+        if spans:
+            last_text, last_start, last_rank = spans[-1]
+            last_end = last_start + len(last_text)
+            if start <= last_end:
+                # Overlapping: append only what extends past the current span
+                tail = text[last_end - start:] if start + len(text) > last_end else ""
+                spans[-1] = (last_text + tail, last_start, min(rank, last_rank))
+                continue
+            if start - last_end <= MAX_GAP:
+                spans[-1] = (last_text + "\n" + text, last_start, min(rank, last_rank))
+                continue
+        spans.append((text, start, rank))
+    return sorted(spans + loose, key=lambda span: span[2])
+
+def compact_context(documents, metadatas, fit, count):
+    """Merge overlapping chunks, keep the best spans that fit, and return them in document order.
+
+    fit(texts) keeps a prefix of texts within the context budget (truncating
+    the last one if needed) and count(text) gives its token count.
+    """
+    before = sum(count(text) for text in documents)
+    spans = merge_chunks(documents, metadatas)
+    kept = fit([text for text, _, _ in spans])
+    # fit keeps a prefix in rank order; restore reading order, loose chunks last
+    kept_spans = sorted(
+        ((text, spans[i][1]) for i, text in enumerate(kept)),
+        key=lambda span: (span[1] is None, span[1] or 0)
+    )
+    context = [text for text, _ in kept_spans]
+    CONTEXT_COMPACTION_TOKENS.labels(stage="before").observe(before)
+    CONTEXT_COMPACTION_TOKENS.labels(stage="after").observe(sum(count(text) for text in context))
+    return context
@@ -1,43 +1,258 @@
-from pypdf import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 import config
+from rag.pdf_extract import pdf_path
+from utils.artifact_store import ArtifactStore
+from utils.monitoring import add_stage_time, ARTIFACT_LOOKUPS
+
+# Text is split once the buffer holds about this many chunks
+STREAM_WINDOW_CHUNKS = 8
+
+def document_hash(pdf_file):
+    """SHA-256 of the PDF bytes, for an upload, an open file or a path; file positions are left at 0"""
+    if hasattr(pdf_file, 'getbuffer'):
+        data = bytes(pdf_file.getbuffer())
+    elif hasattr(pdf_file, 'read'):
+        pdf_file.seek(0)
+        data = pdf_file.read()
+        pdf_file.seek(0)
+    else:
+        with open(pdf_file, "rb") as f: data = f.read()
+    return hashlib.sha256(data).hexdigest()
+
+def prefetch(iterable, max_items):
+    """Run iterable on a background thread, staying at most max_items ahead of the consumer"""
+    items = queue.Queue(max_items)
+    stopped = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stopped.is_set():
+                    try:
+                        items.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stopped.is_set(): return
+            items.put(done)
+        except Exception as e:
+            items.put(e)
+
+    threading.Thread(target=produce, name="ingest-prefetch", daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is done: return
+            if isinstance(item, Exception): raise item
+            yield item
+    finally:
+        stopped.set()
+
+def extract_processes(n_pages, processes=None):
+    """Worker count for a document: 1 (serial) below PDF_PARALLEL_MIN_PAGES, else up to one per core and PDF_EXTRACT_MIN_PAGES_PER_PROCESS pages"""
+    if processes is None: processes = config.PDF_EXTRACT_PROCESSES
+    if processes == 0: processes = os.cpu_count() or 1
+    if n_pages < config.PDF_PARALLEL_MIN_PAGES: return 1
+    return max(1, min(processes, n_pages // config.PDF_EXTRACT_MIN_PAGES_PER_PROCESS))
+
+def read_pages(process):
+    return [json.loads(line) for line in process.stdout]
 
 class DocumentProcessor:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
-    
-    def extract_text_from_pdf(self, pdf_file):
-        """Extract text from uploaded PDF file"""
+    def __init__(self, artifact_store=None):
+        self._text_splitter = None
+        self.artifact_store = artifact_store or ArtifactStore()
+
+    @property
+    def text_splitter(self):
+        # Built on first use so that creating a session stays cheap
+        if self._text_splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=config.CHUNK_SIZE,
+                chunk_overlap=config.CHUNK_OVERLAP,
+                length_function=len,
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return self._text_splitter
+    
+    def count_pages(self, pdf_file, doc_hash=None):
+        if doc_hash and self.artifact_store.has_pages(doc_hash): return self.artifact_store.count_pages(doc_hash)
+        from pypdf import PdfReader
+        return len(PdfReader(pdf_file).pages)
+    
+    def iter_pages(self, pdf_file, processes=None, doc_hash=None):
+        """Yield (page number, text) in page order.
+
+        Pages already in the artifact store under doc_hash are read from
+        there without opening the PDF. Large documents are split into one
+        page range per worker process (see rag.pdf_extract); the first range
+        is streamed as it is extracted while threads collect the others, so
+        pages are still yielded in order. processes overrides
+        PDF_EXTRACT_PROCESSES (1 forces serial extraction).
+        """
+        if doc_hash:
+            found = self.artifact_store.has_pages(doc_hash)
+            ARTIFACT_LOOKUPS.labels(kind="pages", result="hit" if found else "miss").inc()
+            if found:
+                yield from self.artifact_store.iter_pages(doc_hash)
+                return
+        from pypdf import PdfReader
         pdf_reader = PdfReader(pdf_file)
-        text = ""
+        n_pages = len(pdf_reader.pages)
+        workers = extract_processes(n_pages, processes)
+        if workers == 1:
+            for number, page in enumerate(pdf_reader.pages, 1):
+                yield number, page.extract_text() or ""
+            return
         
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        
-        return text
+        print(f"📄 Extracting {n_pages} pages with {workers} processes")
+        bounds = [n_pages * i // workers for i in range(workers + 1)]
+        with pdf_path(pdf_file) as path:
+            procs = [
+                subprocess.Popen([sys.executable, "-m", "rag.pdf_extract", path, str(start), str(end)],
+                                 stdout=subprocess.PIPE, cwd=config.SRC_DIR, text=True, encoding="utf-8")
+                for start, end in zip(bounds, bounds[1:])
+            ]
+            # Later ranges are drained on threads so a full pipe never stalls their worker
+            readers = ThreadPoolExecutor(workers - 1)
+            try:
+                later = [readers.submit(read_pages, proc) for proc in procs[1:]]
+                number = 0
+                for i, proc in enumerate(procs):
+                    texts = map(json.loads, proc.stdout) if i == 0 else later[i - 1].result()
+                    for text in texts:
+                        number += 1
+                        yield number, text
+                    if proc.wait() != 0: raise RuntimeError(f"PDF extraction worker exited with code {proc.returncode}")
+                if number != n_pages: raise RuntimeError(f"PDF extraction returned {number} of {n_pages} pages")
+            finally:
+                # Stopped early or failed: don't wait for the remaining pages
+                for proc in procs:
+                    if proc.poll() is None: proc.kill()
+                    proc.wait()
+                readers.shutdown(wait=False, cancel_futures=True)
+    
+    def extract_text_from_pdf(self, pdf_file, processes=None, doc_hash=None):
+        """Extract text from uploaded PDF file"""
+        return "".join(text + "\n" for _, text in self.iter_pages(pdf_file, processes, doc_hash))
     
     def split_text_into_chunks(self, text):
         """Split text into chunks for embedding"""
         chunks = self.text_splitter.split_text(text)
         return chunks
     
-    def process_pdf(self, pdf_file):
-        """Process PDF: extract text and split into chunks"""
-        print("Processing PDF...")
-        
-        # Extract text
-        text = self.extract_text_from_pdf(pdf_file)
-        
-        if not text.strip():
+    def chunk_offsets(self, text, chunks):
+        """Character offset of each chunk in text (None if not found), stepping past the overlap"""
+        starts = []
+        index, previous_len = 0, 0
+        for chunk in chunks:
+            found = text.find(chunk, max(0, index + previous_len - config.CHUNK_OVERLAP))
+            if found < 0: found = text.find(chunk)
+            starts.append(found if found >= 0 else None)
+            if found >= 0: index, previous_len = found, len(chunk)
+        return starts
+    
+    def stream_chunks(self, pdf_file, processes=None, timings=None, doc_hash=None):
+        """Yield (chunk, metadata) while later pages are still being read.
+
+        Only a few chunks' worth of text is buffered. Each split emits all
+        but the buffer's last chunk, and splitting resumes at that chunk so
+        it can continue onto the next page. Metadata holds chunk_index,
+        start_index in the document text and the first and last page.
+        Time spent extracting and splitting is added to timings["extract"]
+        and timings["chunk"] when a dict is given.
+
+        With doc_hash (the SHA-256 of the PDF) chunks come straight from the
+        artifact store when present; otherwise the pages and chunks are
+        written there once the whole document has been parsed.
+        """
+        if doc_hash:
+            found = self.artifact_store.has_chunks(doc_hash)
+            ARTIFACT_LOOKUPS.labels(kind="chunks", result="hit" if found else "miss").inc()
+            if found:
+                yield from self.artifact_store.iter_chunks(doc_hash)
+                return
+        writer = self.artifact_store.writer(doc_hash) if doc_hash else None
+        try:
+            yield from self._parse_chunks(pdf_file, processes, timings, doc_hash, writer)
+        except BaseException:
+            if writer: writer.abort()
+            raise
+        if writer: writer.commit()
+    
+    def _parse_chunks(self, pdf_file, processes, timings, doc_hash, writer):
+        buffer, buffer_start = "", 0
+        page_starts, page_numbers = [], []
+        chunk_index = 0
+
+        def page_at(position):
+            return page_numbers[max(0, bisect_right(page_starts, position) - 1)]
+
+        def emit(chunks, starts):
+            nonlocal chunk_index
+            for chunk, start in zip(chunks, starts):
+                metadata = {"chunk_index": chunk_index}
+                if start is not None:
+                    position = buffer_start + start
+                    metadata.update(start_index=position, page=page_at(position), page_end=page_at(position + len(chunk) - 1))
+                chunk_index += 1
+                if writer: writer.write_chunk(chunk, metadata)
+                yield chunk, metadata
+
+        pages = self.iter_pages(pdf_file, processes, doc_hash)
+        while True:
+            started = time.perf_counter()
+            number, text = next(pages, (None, None))
+            add_stage_time(timings, "extract", started)
+            if number is None: break
+            if writer: writer.write_page(number, text)
+            page_starts.append(buffer_start + len(buffer))
+            page_numbers.append(number)
+            buffer += text + "\n"
+            if len(buffer) < config.CHUNK_SIZE * STREAM_WINDOW_CHUNKS: continue
+
+            started = time.perf_counter()
+            chunks = self.split_text_into_chunks(buffer)
+            starts = self.chunk_offsets(buffer, chunks)
+            add_stage_time(timings, "chunk", started)
+            yield from emit(chunks[:-1], starts[:-1])
+            resume = starts[-1] if starts[-1] is not None else max(0, len(buffer) - config.CHUNK_SIZE)
+            buffer_start += resume
+            buffer = buffer[resume:]
+            keep = max(0, bisect_right(page_starts, buffer_start) - 1)
+            page_starts, page_numbers = page_starts[keep:], page_numbers[keep:]
+
+        if buffer.strip():
+            started = time.perf_counter()
+            chunks = self.split_text_into_chunks(buffer)
+            starts = self.chunk_offsets(buffer, chunks)
+            add_stage_time(timings, "chunk", started)
+            yield from emit(chunks, starts)
+        if chunk_index == 0:
             raise ValueError("No text could be extracted from the PDF")
+    
+    def process_pdf(self, pdf_file, with_metadata=False, doc_hash=None):
+        """Process PDF: extract text and split into chunks.
+
+        with_metadata also returns the metadata dict of each chunk (see stream_chunks).
+        """
+        print("Processing PDF...")
         
-        # Split into chunks
-        chunks = self.split_text_into_chunks(text)
+        pairs = list(self.stream_chunks(pdf_file, doc_hash=doc_hash))
+        chunks = [chunk for chunk, _ in pairs]
         
         print(f"PDF processed: {len(chunks)} chunks created")
+        if with_metadata:
+            return chunks, [metadata for _, metadata in pairs]
         return chunks
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""Page text extraction in helper processes.
+
+Run as `python -m rag.pdf_extract PDF START END` it prints the text of pages
+START..END-1 (0-based), one JSON string per line, as each page is extracted.
+Workers are plain subprocesses rather than multiprocessing children, so
+they never re-import the app's main script (under `streamlit run`, main.py)
+and start with nothing but pypdf loaded.
+"""
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+@contextmanager
+def pdf_path(pdf_file):
+    """Absolute path of the PDF; uploads and open files are written to a temporary file for the workers"""
+    if not hasattr(pdf_file, 'read') and not hasattr(pdf_file, 'getbuffer'):
+        yield os.path.abspath(pdf_file)
+        return
+    if hasattr(pdf_file, 'getbuffer'):
+        data = bytes(pdf_file.getbuffer())
+    else:
+        pdf_file.seek(0)
+        data = pdf_file.read()
+        pdf_file.seek(0)
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f: f.write(data)
+        yield path
+    finally:
+        os.unlink(path)
+
+def extract_pages(path, start, end):
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    for i in range(start, end):
+        yield reader.pages[i].extract_text() or ""
+
+if __name__ == "__main__":
+    path, start, end = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+    for text in extract_pages(path, start, end):
+        sys.stdout.write(json.dumps(text) + "\n")
+        sys.stdout.flush()
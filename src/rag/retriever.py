@@ -1,4 +1,8 @@
+import time
+import config
 from rag.vector_store import VectorStore
+from utils.database import get_indexed_document
+from utils.monitoring import RETRIEVAL_BATCH_LATENCY, RETRIEVAL_BATCH_SIZE, INGEST_FIRST_BATCH_LATENCY, add_stage_time, observe_stage_times
 
 class Retriever:
     def __init__(self):
@@ -16,7 +20,61 @@ class Retriever:
         
         return context, results
     
-    def add_documents_to_store(self, chunks):
+    def retrieve_many(self, queries, top_k=None):
+        """Retrieve context for many queries in one batch; returns (one context per query, results with one row per query)"""
+        start = time.time()
+        results = self.vector_store.search_many(queries, top_k)
+        RETRIEVAL_BATCH_LATENCY.observe(time.time() - start)
+        RETRIEVAL_BATCH_SIZE.observe(len(queries))
+        
+        contexts = ["\n\n".join(documents) for documents in results['documents']]
+        return contexts, results
+    
+    def open_document(self, user_id, doc_hash):
+        """Scope retrieval to one user's document; returns True if it is already fully indexed"""
+        collection = self.vector_store.open_document(user_id, doc_hash)
+        record = get_indexed_document(user_id, doc_hash)
+        self.vector_store.complete = record is not None and collection.count() >= record['n_chunks']
+        return self.vector_store.complete
+    
+    def add_documents_to_store(self, chunks, metadatas=None):
         """Add document chunks to vector store"""
-        self.vector_store.create_collection()
-        self.vector_store.add_documents(chunks)
\ No newline at end of file
+        if self.vector_store.collection is None:
+            self.vector_store.create_collection()
+        return self.vector_store.add_documents(chunks, metadatas)
+    
+    def index_stream(self, chunk_stream, batch_size=None, timings=None, on_batch=None):
+        """Embed and upsert (chunk, metadata) pairs in bounded batches as they arrive.
+
+        Earlier batches are searchable through Chroma while later pages are
+        still being parsed. Returns (number of chunks, number of characters).
+        timings collects per-stage seconds (shared with the chunk stream) and
+        is recorded in INGEST_STAGE_LATENCY once the document is indexed.
+        on_batch(chunks so far, metadata of the batch's last chunk) runs
+        after each batch is stored, e.g. to checkpoint progress.
+        """
+        if self.vector_store.collection is None:
+            self.vector_store.create_collection()
+        batch_size = batch_size or config.INGEST_BATCH_SIZE
+        start = time.time()
+        n_chunks = n_chars = 0
+        batch = []
+        
+        def flush():
+            self.vector_store.add_documents([c for c, _ in batch], [m for _, m in batch], refresh_indexes=False, timings=timings)
+            if n_chunks <= len(batch): INGEST_FIRST_BATCH_LATENCY.observe(time.time() - start)
+            if on_batch: on_batch(n_chunks, batch[-1][1])
+            batch.clear()
+        
+        for chunk, metadata in chunk_stream:
+            batch.append((chunk, metadata))
+            n_chunks += 1
+            n_chars += len(chunk)
+            if len(batch) >= batch_size: flush()
+        if batch: flush()
+        
+        started = time.perf_counter()
+        self.vector_store.refresh_indexes()
+        add_stage_time(timings, "index", started)
+        if timings: observe_stage_times(timings)
+        return n_chunks, n_chars
@@ -0,0 +1,95 @@
+import time
+from collections import deque
+import numpy as np
+import config
+from models.scheduler import Priority
+from utils.monitoring import STUDY_GUIDE_PAIRS, STUDY_GUIDE_THROUGHPUT
+
+def kmeans(vectors, k, iterations=20, seed=0):
+    """Plain k-means++ on unit vectors; returns (cluster index of each row, unit centroids)"""
+    rng = np.random.default_rng(seed)
+    centroids = [vectors[rng.integers(len(vectors))]]
+    for _ in range(1, k):
+        dist = np.min([1 - vectors @ c for c in centroids], axis=0).clip(min=0) ** 2
+        probs = dist / dist.sum() if dist.sum() > 0 else None
+        centroids.append(vectors[rng.choice(len(vectors), p=probs)])
+    centroids = np.array(centroids)
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if labels is not None and np.array_equal(labels, new_labels): break
+        labels = new_labels
+        for j in range(k):
+            members = vectors[labels == j]
+            if not len(members): continue
+            mean = members.mean(axis=0)
+            centroids[j] = mean / max(np.linalg.norm(mean), 1e-12)
+    return labels, centroids
+
+class StudyGuideGenerator:
+    """Generates a study guide covering the whole document.
+
+    Chunks are clustered on the embeddings already stored in Chroma and the
+    chunk closest to each cluster centre stands in for that part of the
+    document. Representatives are sent to the LLM a few at a time in one
+    prompt, and the guide is yielded after every batch.
+    """
+
+    def __init__(self, llm_handler, scheduler, vector_store):
+        self.llm_handler = llm_handler
+        self.scheduler = scheduler
+        self.vector_store = vector_store
+
+    def select_chunks(self, max_chunks=None):
+        """Pick one representative chunk per topic cluster, returned in document order"""
+        max_chunks = max_chunks or config.STUDY_GUIDE_MAX_PAIRS
+        data = self.vector_store.collection.get(include=["documents", "embeddings", "metadatas"])
+        # Ids are content hashes, so document order comes from the chunk_index metadata
+        order = sorted(range(len(data["documents"])), key=lambda i: (data["metadatas"][i] or {}).get("chunk_index", i))
+        documents = [data["documents"][i] for i in order]
+        if len(documents) <= max_chunks: return documents
+
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)[order]
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        labels, centroids = kmeans(vectors, max_chunks)
+
+        picked = []
+        for j in range(max_chunks):
+            members = np.flatnonzero(labels == j)
+            if len(members): picked.append(members[np.argmax(vectors[members] @ centroids[j])])
+        return [documents[i] for i in sorted(picked)]
+
+    def generate(self, user_id=None):
+        """Yield (study guide text, pairs so far) after each batch of Q&A pairs completes"""
+        chunks = self.select_chunks()
+        size = config.STUDY_GUIDE_CHUNKS_PER_PROMPT
+        batches = [chunks[i:i + size] for i in range(0, len(chunks), size)]
+
+        start = time.time()
+        pairs = []
+        pending = deque()
+        next_batch = 0
+        # Keep as many batches in flight as the scheduler lets one user queue,
+        # so a multi-worker backend can decode them side by side. A queued
+        # batch may wait behind every batch ahead of it, so its queue timeout
+        # grows by STUDY_GUIDE_BATCH_TIMEOUT per batch in front.
+        try:
+            while next_batch < len(batches) or pending:
+                while next_batch < len(batches) and len(pending) < config.SCHEDULER_MAX_PER_USER:
+                    pending.append(self.scheduler.submit(
+                        self.llm_handler.generate_qa_for_batch, batches[next_batch],
+                        user_id=user_id, priority=Priority.BATCH,
+                        timeout=config.SCHEDULER_QUEUE_TIMEOUT + len(pending) * config.STUDY_GUIDE_BATCH_TIMEOUT
+                    ))
+                    next_batch += 1
+                batch_pairs = pending.popleft().result()
+                pairs.extend(batch_pairs)
+                STUDY_GUIDE_PAIRS.inc(len(batch_pairs))
+                yield "\n\n".join(pairs), len(pairs)
+        finally:
+            # Failed or abandoned: don't leave batches queued for nobody
+            for request in pending: request.cancel()
+
+        elapsed = time.time() - start
+        if pairs: STUDY_GUIDE_THROUGHPUT.observe(len(pairs) / max(elapsed, 1e-6))
@@ -1,20 +1,114 @@
-import chromadb
-from chromadb.config import Settings
+import json
+import os
+import threading
+import time
+import numpy as np
 import config
 from models.embeddings import EmbeddingHandler
+from models.query_batcher import get_query_batcher
+from rag.bm25 import BM25Index, reciprocal_rank_fusion
+from utils.embedding_cache import hash_text
+from utils.resources import RESOURCES
+from utils.monitoring import VECTOR_SEARCH_LATENCY, add_stage_time
+
+def build_chroma_client():
+    """Initialize ChromaDB client"""
+    import chromadb
+    return chromadb.PersistentClient(
+        path=str(config.VECTOR_DB_DIR)
+    )
+
+def document_collection_name(user_id, doc_hash):
+    return f"doc_u{user_id}_{doc_hash[:40]}"
+
+class NumpyIndex:
+    """Exact cosine search over a collection's embeddings held in one float32 matrix.
+
+    For the few hundred chunks of a typical PDF a matrix-vector product is
+    faster than HNSW and never misses a neighbour. The matrix can be saved
+    as .npy and memory-mapped, so sessions on the same document share pages.
+    """
+
+    def __init__(self, ids, documents, metadatas, matrix):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.matrix = matrix
+
+    @classmethod
+    def from_collection(cls, collection, mmap_dir=None):
+        count = collection.count()
+        if mmap_dir is not None:
+            matrix_path = mmap_dir / f"{collection.name}.npy"
+            ids_path = mmap_dir / f"{collection.name}.ids.json"
+            if matrix_path.exists() and ids_path.exists():
+                ids = json.loads(ids_path.read_text())
+                matrix = np.load(matrix_path, mmap_mode="r")
+                # A writer may have swapped one file but not yet the other
+                if len(ids) == count and matrix.shape[0] == len(ids):
+                    data = collection.get(ids=ids, include=["documents", "metadatas"])
+                    if len(data["ids"]) == len(ids):
+                        by_id = {i: (d, m) for i, d, m in zip(data["ids"], data["documents"], data["metadatas"])}
+                        return cls(ids, [by_id[i][0] for i in ids], [by_id[i][1] for i in ids], matrix)
+
+        data = collection.get(include=["documents", "metadatas", "embeddings"])
+        if not data["ids"]: return cls([], [], [], np.zeros((0, 1), dtype=np.float32))
+        matrix = np.asarray(data["embeddings"], dtype=np.float32).reshape(len(data["ids"]), -1)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        if mmap_dir is not None:
+            # Both files are written aside and renamed, matrix first, so other
+            # sessions never read a half-written file; load checks they agree
+            mmap_dir.mkdir(parents=True, exist_ok=True)
+            suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp_path = mmap_dir / f"{collection.name}.{suffix}.npy"
+            tmp_ids_path = mmap_dir / f"{collection.name}.ids.{suffix}"
+            np.save(tmp_path, matrix)
+            tmp_ids_path.write_text(json.dumps(data["ids"]))
+            os.replace(tmp_path, matrix_path)
+            os.replace(tmp_ids_path, ids_path)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        return cls(data["ids"], data["documents"], data["metadatas"], matrix)
+
+    def search(self, query_embedding, top_k):
+        """Top-k by cosine similarity, shaped like a Chroma query result (distance = 1 - similarity)"""
+        return self.search_many(np.asarray(query_embedding, dtype=np.float32)[None, :], top_k)
+
+    def search_many(self, query_embeddings, top_k):
+        """Top-k for every row of query_embeddings in one matrix product; one result row per query"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # A document still queued for ingestion has no chunks yet
+        if not self.ids: return {key: [[] for _ in queries] for key in ('ids', 'documents', 'metadatas', 'distances')}
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ self.matrix.T
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k else np.zeros((len(queries), 0), dtype=int)
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+        return {
+            'ids': [[self.ids[i] for i in row] for row in top],
+            'documents': [[self.documents[i] for i in row] for row in top],
+            'metadatas': [[self.metadatas[i] for i in row] for row in top],
+            'distances': [[float(1 - scores[q, i]) for i in row] for q, row in enumerate(top)],
+        }
+
+def drop_numpy_index(collection_name):
+    for suffix in (".npy", ".ids.json"):
+        (config.NUMPY_INDEX_DIR / f"{collection_name}{suffix}").unlink(missing_ok=True)
 
 class VectorStore:
     def __init__(self):
         self.client = None
         self.collection = None
+        self.numpy_index = None
+        self.backend = None
+        self.keyword_index = None
+        # False while the collection is still being ingested: indexes built from it are kept in memory only
+        self.complete = True
         self.embedding_handler = EmbeddingHandler()
         self.initialize_client()
     
     def initialize_client(self):
-        """Initialize ChromaDB client"""
-        self.client = chromadb.PersistentClient(
-            path=str(config.VECTOR_DB_DIR)
-        )
+        """Attach to the process-wide ChromaDB client"""
+        self.client = RESOURCES.get("chroma_client", build_chroma_client)
     
     def create_collection(self, collection_name=None):
         """Create or get a collection"""
@@ -27,54 +121,194 @@ class VectorStore:
             name=collection_name,
             metadata={"hnsw:space": "cosine"}
         )
+        self.reset_indexes()
         
         return self.collection
         
         return self.collection
     
-    def add_documents(self, chunks):
-        """Add document chunks to vector store"""
+    def open_document(self, user_id, doc_hash):
+        """Point the store at the collection holding one user's copy of one document"""
+        self.collection = self.client.get_or_create_collection(
+            name=document_collection_name(user_id, doc_hash),
+            metadata={"hnsw:space": "cosine", "user_id": str(user_id), "doc_hash": doc_hash}
+        )
+        self.reset_indexes()
+        return self.collection
+    
+    def add_documents(self, chunks, metadatas=None, refresh_indexes=True, timings=None):
+        """Upsert document chunks, embedding only those not stored yet; returns how many were new.
+
+        Streaming ingest passes refresh_indexes=False for each batch and calls
+        refresh_indexes() once at the end, instead of rebuilding BM25 per batch.
+        Embedding and upsert time is added to timings["embed"] / ["index"].
+        """
         if self.collection is None:
             self.create_collection()
         
-        print("Generating embeddings for document chunks...")
-        embeddings = self.embedding_handler.get_embeddings(chunks)
+        # Ids are content hashes, so repeated chunks are stored once and re-adds are no-ops
+        unique = {}
+        for i, chunk in enumerate(chunks):
+            metadata = {"chunk_index": i}
+            if metadatas is not None: metadata.update({k: v for k, v in metadatas[i].items() if v is not None})
+            unique.setdefault(hash_text(chunk), (metadata, chunk))
+        existing = set(self.collection.get(ids=list(unique), include=[])['ids']) if unique else set()
+        ids = [chunk_id for chunk_id in unique if chunk_id not in existing]
+        if not ids:
+            print("All chunks already in vector store")
+            return 0
         
-        # Prepare data for ChromaDB
-        ids = [f"chunk_{i}" for i in range(len(chunks))]
+        print("Generating embeddings for document chunks...")
+        new_chunks = [unique[chunk_id][1] for chunk_id in ids]
+        started = time.perf_counter()
+        embeddings = self.embedding_handler.get_chunk_embeddings(new_chunks)
+        add_stage_time(timings, "embed", started)
         
         print("Adding documents to vector store...")
-        self.collection.add(
+        started = time.perf_counter()
+        self.collection.upsert(
             embeddings=embeddings.tolist(),
-            documents=chunks,
+            documents=new_chunks,
+            metadatas=[unique[chunk_id][0] for chunk_id in ids],
             ids=ids
         )
         
-        print(f"Successfully added {len(chunks)} chunks to vector store")
+        if refresh_indexes: self.refresh_indexes()
+        add_stage_time(timings, "index", started)
+        print(f"Successfully added {len(ids)} new chunks to vector store ({len(existing)} already present)")
+        return len(ids)
+    
+    def refresh_indexes(self):
+        """Drop the stale NumPy index and rebuild BM25 after the collection changed"""
+        self.reset_indexes()
+        drop_numpy_index(self.collection.name)
+        self.build_keyword_index()
+    
+    def reset_indexes(self):
+        """Forget the in-memory indexes of the previous collection"""
+        self.numpy_index = self.backend = self.keyword_index = None
+    
+    def keyword_index_path(self):
+        return config.BM25_INDEX_DIR / f"{self.collection.name}.json"
+    
+    def build_keyword_index(self, save=True):
+        """(Re)build the BM25 postings of the whole collection, saving them next to the Chroma data unless save is False"""
+        data = self.collection.get(include=["documents"])
+        self.keyword_index = BM25Index.build(data['ids'], data['documents'])
+        if save: self.keyword_index.save(self.keyword_index_path())
+        return self.keyword_index
+    
+    def get_keyword_index(self):
+        # Collections indexed before BM25 existed get their postings on first use
+        if self.keyword_index is None:
+            path = self.keyword_index_path()
+            index = BM25Index.load(path) if path.exists() else None
+            # A file saved from a partial collection is rebuilt, as NumpyIndex does
+            if index is not None and len(index.ids) == self.collection.count():
+                self.keyword_index = index
+            else:
+                self.build_keyword_index(save=self.complete)
+        return self.keyword_index
+    
+    def first_chunk(self):
+        """Opening chunk of the current document, or None"""
+        data = self.collection.get(where={"chunk_index": 0}, include=["documents"])
+        return data['documents'][0] if data['documents'] else None
+    
+    def search(self, query, top_k=None, mode=None):
+        """Search for relevant documents.
+
+        mode is "dense" (embeddings), "bm25" (keywords) or "hybrid", which
+        fuses both rankings with reciprocal rank fusion.
+        """
+        return self.search_many([query], top_k, mode)
     
-    def search(self, query, top_k=None):
-        """Search for relevant documents"""
+    def search_many(self, queries, top_k=None, mode=None):
+        """Search for several queries with one embedding batch and one nearest-neighbour pass.
+
+        Returns Chroma-shaped results with one row per query.
+        """
         top_k = top_k or config.TOP_K_RETRIEVAL
+        mode = mode or config.RETRIEVAL_MODE
         
         if self.collection is None:
             raise ValueError("No collection available. Please upload a document first.")
         
-        # Generate query embedding
-        query_embedding = self.embedding_handler.get_embeddings([query])[0]
+        if mode == "bm25":
+            return self.fetch_many([[chunk_id for chunk_id, _ in self.keyword_search(q, top_k)] for q in queries])
         
-        # Search in vector store
-        results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=top_k
-        )
+        # Generate query embeddings
+        query_embeddings = get_query_batcher().embed_many(queries)
+        n_candidates = max(top_k, config.HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+        results = self.dense_search(query_embeddings, n_candidates)
+        if mode == "dense": return results
         
+        fused = [
+            reciprocal_rank_fusion([results['ids'][i], [chunk_id for chunk_id, _ in self.keyword_search(q, n_candidates)]], top_k)
+            for i, q in enumerate(queries)
+        ]
+        return self.fetch_many(fused, known=results)
+    
+    def dense_search(self, query_embeddings, top_k):
+        start = time.time()
+        if self.select_backend() == "numpy":
+            results = self.numpy_index.search_many(query_embeddings, top_k)
+        else:
+            results = self.collection.query(
+                query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+                n_results=top_k
+            )
+        VECTOR_SEARCH_LATENCY.labels(backend=self.backend).observe(time.time() - start)
         return results
     
+    def keyword_search(self, query, top_k):
+        start = time.time()
+        hits = self.get_keyword_index().search(query, top_k)
+        VECTOR_SEARCH_LATENCY.labels(backend="bm25").observe(time.time() - start)
+        return hits
+    
+    def fetch_many(self, id_rows, known=None):
+        """Chroma-shaped results for each row of ids, reusing rows of an earlier result.
+
+        Chunks only found by keyword have no vector distance; theirs is None.
+        All chunks missing from known are read in one collection.get.
+        """
+        rows = {}
+        if known is not None:
+            for q in range(len(known['ids'])):
+                for i, chunk_id in enumerate(known['ids'][q]):
+                    rows.setdefault(chunk_id, (known['documents'][q][i], known['metadatas'][q][i], {}))[2][q] = known['distances'][q][i]
+        missing = list({chunk_id for ids in id_rows for chunk_id in ids if chunk_id not in rows})
+        if missing:
+            data = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            for chunk_id, document, metadata in zip(data['ids'], data['documents'], data['metadatas']):
+                rows[chunk_id] = (document, metadata, {})
+        id_rows = [[chunk_id for chunk_id in ids if chunk_id in rows] for ids in id_rows]
+        return {
+            'ids': id_rows,
+            'documents': [[rows[chunk_id][0] for chunk_id in ids] for ids in id_rows],
+            'metadatas': [[rows[chunk_id][1] for chunk_id in ids] for ids in id_rows],
+            'distances': [[rows[chunk_id][2].get(q) for chunk_id in ids] for q, ids in enumerate(id_rows)],
+        }
+    
+    def select_backend(self):
+        """Exact NumPy search for small collections, Chroma's HNSW for large ones (RETRIEVAL_BACKEND = "auto")"""
+        if self.backend is None:
+            backend = config.RETRIEVAL_BACKEND
+            if backend == "auto":
+                backend = "numpy" if self.collection.count() <= config.NUMPY_RETRIEVAL_MAX_CHUNKS else "chroma"
+            if backend == "numpy":
+                mmap_dir = config.NUMPY_INDEX_DIR if config.NUMPY_INDEX_MMAP else None
+                self.numpy_index = NumpyIndex.from_collection(self.collection, mmap_dir)
+            self.backend = backend
+        return self.backend
+    
     def get_collection(self, collection_name=None):
         """Get existing collection"""
         collection_name = collection_name or config.VECTOR_DB_NAME
         try:
             self.collection = self.client.get_collection(name=collection_name)
+            self.reset_indexes()
             return self.collection
         except:
             return None
\ No newline at end of file
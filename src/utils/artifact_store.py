@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+import threading
+import config
+
+class ArtifactStore:
+    """Parsed documents on disk, one gzip-compressed JSONL file per SHA-256 of the PDF.
+
+    The first record holds the chunking parameters, then come {"page", "text"}
+    records for extracted pages and {"chunk", "metadata"} records for chunks
+    with their offsets, in the order they were produced. Pages are reusable
+    under any chunking; chunks only while CHUNK_SIZE and CHUNK_OVERLAP are
+    unchanged. A file appears only once its document was parsed completely,
+    after a small {doc_hash}.meta.json sidecar holding the page count.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or config.ARTIFACT_DIR
+
+    def path(self, doc_hash):
+        return self.root / f"{doc_hash}.jsonl.gz"
+
+    def meta_path(self, doc_hash):
+        return self.root / f"{doc_hash}.meta.json"
+
+    def records(self, doc_hash):
+        with gzip.open(self.path(doc_hash), "rt", encoding="utf-8") as f:
+            for line in f: yield json.loads(line)
+
+    def has_pages(self, doc_hash):
+        return self.path(doc_hash).exists()
+
+    def has_chunks(self, doc_hash):
+        return self.path(doc_hash).exists() and next(self.records(doc_hash)) == chunking_params()
+
+    def iter_pages(self, doc_hash):
+        for record in self.records(doc_hash):
+            if "page" in record: yield record["page"], record["text"]
+
+    def iter_chunks(self, doc_hash):
+        for record in self.records(doc_hash):
+            if "chunk" in record: yield record["chunk"], record["metadata"]
+
+    def count_pages(self, doc_hash):
+        """Page count from the sidecar; artifacts written without one are read through"""
+        try:
+            with open(self.meta_path(doc_hash), encoding="utf-8") as f: return json.load(f)["pages"]
+        except (OSError, ValueError, KeyError):
+            return sum(1 for _ in self.iter_pages(doc_hash))
+
+    def writer(self, doc_hash):
+        return ArtifactWriter(self.path(doc_hash), self.meta_path(doc_hash))
+
+def chunking_params():
+    return {"chunk_size": config.CHUNK_SIZE, "chunk_overlap": config.CHUNK_OVERLAP}
+
+class ArtifactWriter:
+    """Streams records to a temporary file; commit() moves it into place, abort() discards it"""
+
+    def __init__(self, path, meta_path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.meta_path = meta_path
+        self.pages = 0
+        self.tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self.file = gzip.open(self.tmp_path, "wt", encoding="utf-8")
+        self.write(chunking_params())
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def write_page(self, number, text):
+        self.write({"page": number, "text": text})
+        self.pages += 1
+
+    def write_chunk(self, chunk, metadata):
+        self.write({"chunk": chunk, "metadata": metadata})
+
+    def commit(self):
+        self.file.close()
+        # The sidecar goes first so an artifact never appears without it
+        meta_tmp = self.meta_path.with_name(self.tmp_path.name.replace(".jsonl.gz", ".meta.json"))
+        with open(meta_tmp, "w", encoding="utf-8") as f: json.dump({"pages": self.pages}, f)
+        os.replace(meta_tmp, self.meta_path)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
@@ -1,9 +1,9 @@
 import sqlite3
 import hashlib
 import csv
+import json
 from pathlib import Path
 from datetime import datetime
-import pandas as pd
 
 DB_DIR = Path(__file__).parent / "data"
 DB_DIR.mkdir(parents=True, exist_ok=True)
@@ -13,6 +13,12 @@ FEEDBACK_CSV = DB_DIR / "feedback.csv"
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
+def add_column_if_missing(cursor, table, column, declaration):
+    """Migrate databases created before a column existed"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
 def init_users_database():
     conn = sqlite3.connect(USERS_DB)
     cursor = conn.cursor()
@@ -35,12 +41,15 @@ def init_users_database():
             title TEXT,
             mode TEXT DEFAULT 'LLM',
             pdf_name TEXT,
+            doc_hash TEXT,
             study_guide TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
 
+    add_column_if_missing(cursor, 'chats', 'doc_hash', 'TEXT')
+
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS messages (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,6 +60,35 @@ def init_users_database():
             FOREIGN KEY (chat_id) REFERENCES chats (id)
         )
     ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS background_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            dedup_key TEXT UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            progress TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    add_column_if_missing(cursor, 'background_jobs', 'progress', 'TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_background_jobs_status ON background_jobs (status, kind)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indexed_documents (
+            user_id INTEGER NOT NULL,
+            doc_hash TEXT NOT NULL,
+            file_name TEXT,
+            n_chunks INTEGER NOT NULL,
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, doc_hash)
+        )
+    ''')
     
     conn.commit()
     conn.close()
@@ -107,15 +145,22 @@ def update_chat_title(chat_id, new_title):
     conn.commit()
     conn.close()
 
-def update_chat_mode_pdf(chat_id, mode, pdf_name=None, study_guide=None):
-    """Updates mode, pdf reference, and study guide"""
+def update_chat_mode_pdf(chat_id, mode, pdf_name=None, study_guide=None, doc_hash=None):
+    """Updates mode, pdf reference (display name and SHA-256 of the file), and study guide"""
     conn = sqlite3.connect(USERS_DB)
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE chats 
-        SET mode = ?, pdf_name = ?, study_guide = ? 
+        SET mode = ?, pdf_name = ?, doc_hash = ?, study_guide = ? 
         WHERE id = ?
-    ''', (mode, pdf_name, study_guide, chat_id))
+    ''', (mode, pdf_name, doc_hash, study_guide, chat_id))
+    conn.commit()
+    conn.close()
+
+def update_chat_study_guide(chat_id, study_guide):
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE chats SET study_guide = ? WHERE id = ?', (study_guide, chat_id))
     conn.commit()
     conn.close()
 
@@ -132,7 +177,7 @@ def get_user_chats(user_id):
     conn = sqlite3.connect(USERS_DB)
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT id, title, mode, pdf_name, study_guide, created_at 
+        SELECT id, title, mode, pdf_name, study_guide, created_at, doc_hash 
         FROM chats WHERE user_id = ? ORDER BY created_at DESC
     ''', (user_id,))
     rows = cursor.fetchall()
@@ -146,6 +191,7 @@ def get_user_chats(user_id):
             'pdf_name': r[3],
             'study_guide': r[4],
             'timestamp': r[5],
+            'doc_hash': r[6],
             'messages': [],
             'pdf_ref': None  
         }
@@ -160,6 +206,144 @@ def get_chat_messages(chat_id):
     conn.close()
     return [{'role': r[0], 'content': r[1]} for r in rows]
 
+def get_chat_titles(user_id):
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, title FROM chats WHERE user_id = ?', (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return {r[0]: r[1] for r in rows}
+
+# --- INDEXED DOCUMENT FUNCTIONS ---
+def mark_document_indexed(user_id, doc_hash, file_name, n_chunks):
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO indexed_documents (user_id, doc_hash, file_name, n_chunks)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, doc_hash, file_name, n_chunks))
+    conn.commit()
+    conn.close()
+
+def get_indexed_document(user_id, doc_hash):
+    """Returns the index record of a user's document, or None if it was never fully indexed"""
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('SELECT file_name, n_chunks, indexed_at FROM indexed_documents WHERE user_id = ? AND doc_hash = ?',
+                   (user_id, doc_hash))
+    row = cursor.fetchone()
+    conn.close()
+    return {'file_name': row[0], 'n_chunks': row[1], 'indexed_at': row[2]} if row else None
+
+# --- BACKGROUND JOB FUNCTIONS ---
+def enqueue_job(kind, payload, dedup_key=None):
+    """Queue a job; a job with the same dedup_key that is still pending or running is left alone"""
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO background_jobs (kind, dedup_key, payload) VALUES (?, ?, ?)
+        ON CONFLICT (dedup_key) DO UPDATE SET
+            payload = excluded.payload, status = 'pending', attempts = 0,
+            result = NULL, error = NULL, progress = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE background_jobs.status IN ('done', 'failed')
+    ''', (kind, dedup_key, json.dumps(payload)))
+    conn.commit()
+    conn.close()
+
+def claim_next_job(kinds):
+    """Atomically mark the oldest pending job of the given kinds as running and return it"""
+    conn = sqlite3.connect(USERS_DB, isolation_level=None)
+    cursor = conn.cursor()
+    placeholders = ",".join("?" for _ in kinds)
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'''
+            SELECT id, kind, payload, attempts, progress FROM background_jobs
+            WHERE status = 'pending' AND kind IN ({placeholders}) ORDER BY id LIMIT 1
+        ''', tuple(kinds))
+        row = cursor.fetchone()
+        if row:
+            cursor.execute('''
+                UPDATE background_jobs SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (row[0],))
+        cursor.execute('COMMIT')
+    finally:
+        conn.close()
+    if not row: return None
+    return {
+        'id': row[0], 'kind': row[1], 'payload': json.loads(row[2]), 'attempts': row[3] + 1,
+        'progress': json.loads(row[4]) if row[4] else {}
+    }
+
+def finish_job(job_id, status, result=None, error=None):
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE background_jobs SET status = ?, result = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    ''', (status, json.dumps(result) if result is not None else None, error, job_id))
+    conn.commit()
+    conn.close()
+
+def update_job_progress(job_id, progress):
+    """Persist a running job's progress; it doubles as the checkpoint a retried job resumes from"""
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE background_jobs SET progress = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    ''', (json.dumps(progress), job_id))
+    conn.commit()
+    conn.close()
+
+def get_job(dedup_key):
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, kind, status, attempts, progress, error FROM background_jobs WHERE dedup_key = ?
+    ''', (dedup_key,))
+    row = cursor.fetchone()
+    conn.close()
+    if not row: return None
+    return {
+        'id': row[0], 'kind': row[1], 'status': row[2], 'attempts': row[3],
+        'progress': json.loads(row[4]) if row[4] else {}, 'error': row[5]
+    }
+
+def requeue_running_jobs(kinds, max_attempts):
+    """Jobs left 'running' by a previous process were interrupted; run them again.
+
+    A job that already used max_attempts (e.g. a document that crashes the
+    process every time) is marked failed instead. Returns the failed kinds.
+    """
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    placeholders = ",".join("?" for _ in kinds)
+    cursor.execute(f'''
+        SELECT kind FROM background_jobs WHERE status = 'running' AND attempts >= ? AND kind IN ({placeholders})
+    ''', (max_attempts, *kinds))
+    failed = [row[0] for row in cursor.fetchall()]
+    cursor.execute(f'''
+        UPDATE background_jobs SET status = 'failed', error = 'Interrupted on every attempt',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'running' AND attempts >= ? AND kind IN ({placeholders})
+    ''', (max_attempts, *kinds))
+    cursor.execute(f'''
+        UPDATE background_jobs SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'running' AND kind IN ({placeholders})
+    ''', tuple(kinds))
+    conn.commit()
+    conn.close()
+    return failed
+
+def count_jobs(kinds, status):
+    conn = sqlite3.connect(USERS_DB)
+    cursor = conn.cursor()
+    placeholders = ",".join("?" for _ in kinds)
+    cursor.execute(f'SELECT COUNT(*) FROM background_jobs WHERE status = ? AND kind IN ({placeholders})', (status, *kinds))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
 # --- FEEDBACK FUNCTIONS ---
 def init_feedback_csv():
     if not FEEDBACK_CSV.exists():
@@ -178,5 +362,6 @@ def save_feedback(username, mode, user_query, ai_response, feedback_type, feedba
     except Exception:
         return False
 
-init_users_database()
-init_feedback_csv()
\ No newline at end of file
+def init_databases():
+    init_users_database()
+    init_feedback_csv()
\ No newline at end of file
@@ -0,0 +1,101 @@
+import hashlib
+import sqlite3
+import time
+import numpy as np
+import config
+from utils.monitoring import EMBEDDING_CACHE_SIZE
+
+# SQLite caps the number of ? parameters in one statement
+LOOKUP_BATCH = 500
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Content-addressed store of chunk embeddings.
+
+    Entries are keyed by (model name, sha256 of the text), so a chunk is
+    encoded once no matter how often or under which file name its document
+    is processed. The database is read through mmap, and the least recently
+    used entries are dropped once the stored vectors exceed max_bytes.
+    """
+
+    def __init__(self, db_path=None, max_bytes=None):
+        self.db_path = db_path or config.CHUNK_EMBEDDING_CACHE_DB
+        self.max_bytes = max_bytes or config.CHUNK_EMBEDDING_CACHE_MAX_BYTES
+        self.init_database()
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f'PRAGMA mmap_size = {self.max_bytes * 2}')
+        return conn
+
+    def init_database(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_accessed REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_lru ON embedding_cache (last_accessed)')
+        conn.commit()
+        conn.close()
+
+    def get_many(self, model, hashes, dtype=np.float32):
+        """Return {text_hash: vector} for the hashes that are cached; dtype must match what was stored"""
+        found = {}
+        hashes = list(dict.fromkeys(hashes))
+        conn = self.connect()
+        cursor = conn.cursor()
+        for i in range(0, len(hashes), LOOKUP_BATCH):
+            batch = hashes[i:i + LOOKUP_BATCH]
+            marks = ",".join("?" * len(batch))
+            cursor.execute(
+                f'SELECT text_hash, embedding FROM embedding_cache WHERE model = ? AND text_hash IN ({marks})',
+                [model] + batch
+            )
+            for text_hash, blob in cursor.fetchall():
+                found[text_hash] = np.frombuffer(blob, dtype=dtype)
+            cursor.execute(
+                f'UPDATE embedding_cache SET last_accessed = ? WHERE model = ? AND text_hash IN ({marks})',
+                [time.time(), model] + batch
+            )
+        conn.commit()
+        conn.close()
+        return found
+
+    def put_many(self, model, embeddings):
+        """Store {text_hash: vector} and evict down to max_bytes"""
+        now = time.time()
+        rows = []
+        for text_hash, vector in embeddings.items():
+            blob = np.asarray(vector).tobytes()
+            rows.append((model, text_hash, blob, len(blob), now))
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO embedding_cache (model, text_hash, embedding, nbytes, last_accessed)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        self._evict(cursor)
+        conn.commit()
+        conn.close()
+
+    def _evict(self, cursor):
+        """Keep the most recently used entries whose sizes add up to at most max_bytes"""
+        cursor.execute('''
+            DELETE FROM embedding_cache WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(nbytes) OVER (ORDER BY last_accessed DESC, rowid DESC) AS running
+                    FROM embedding_cache
+                ) WHERE running > ?
+            )
+        ''', (self.max_bytes,))
+        cursor.execute('SELECT COALESCE(SUM(nbytes), 0) FROM embedding_cache')
+        EMBEDDING_CACHE_SIZE.set(cursor.fetchone()[0])
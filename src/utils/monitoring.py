@@ -1,3 +1,7 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import streamlit as st
 from prometheus_client import start_http_server, Counter, Gauge, Summary, Histogram
 
@@ -24,11 +28,244 @@ LATENCY_SUMMARY = Summary(
     'Time spent generating response'
 )
 
+TIME_TO_FIRST_TOKEN = Histogram(
+    'llm_time_to_first_token_seconds',
+    'Time from request start until the first generated token (prefill cost)',
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 60.0]
+)
+
+INTER_TOKEN_LATENCY = Histogram(
+    'llm_inter_token_latency_seconds',
+    'Time between consecutive generated tokens (decode cost)',
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+)
+
+TOKENS_PER_SECOND = Histogram(
+    'llm_decode_tokens_per_second',
+    'Decode throughput of a single response, excluding prefill',
+    ['decoding'],
+    buckets=[1, 2, 5, 10, 20, 40, 60, 100, 200]
+)
+
+SPECULATIVE_ACCEPTANCE = Histogram(
+    'llm_speculative_acceptance_ratio',
+    'Estimated share of drafted tokens accepted by the main model, per response',
+    ['decoding'],
+    buckets=[0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+)
+
+PROMPT_CACHE_HITS = Counter(
+    'llm_prompt_cache_hits_total',
+    'Chat turns that resumed from a cached llama.cpp state',
+    ['tier']
+)
+
+PROMPT_CACHE_MISSES = Counter(
+    'llm_prompt_cache_misses_total',
+    'Chat turns that had to prefill the transcript from token zero'
+)
+
+PROMPT_CACHE_TOKENS_REUSED = Counter(
+    'llm_prompt_cache_tokens_reused_total',
+    'Prompt tokens skipped during prefill thanks to the prompt cache'
+)
+
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    'llm_scheduler_queue_depth',
+    'Inference requests waiting for the model',
+    ['priority']
+)
+
+SCHEDULER_WAIT_SECONDS = Histogram(
+    'llm_scheduler_wait_seconds',
+    'Time a request spent queued before the model started on it',
+    ['priority'],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+)
+
+SCHEDULER_REJECTIONS = Counter(
+    'llm_scheduler_rejections_total',
+    'Inference requests rejected or dropped by the scheduler',
+    ['reason']
+)
+
+PROMPT_SECTION_TOKENS = Histogram(
+    'llm_prompt_section_tokens',
+    'Tokens used by each prompt section after fitting the context window',
+    ['section'],
+    buckets=[16, 64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096]
+)
+
+PROMPT_SECTION_TRIMMED = Counter(
+    'llm_prompt_section_trimmed_total',
+    'Prompts where a section was dropped or truncated to fit the token budget',
+    ['section']
+)
+
+STUDY_GUIDE_PAIRS = Counter(
+    'study_guide_qa_pairs_total',
+    'Q&A pairs generated for study guides'
+)
+
+STUDY_GUIDE_THROUGHPUT = Histogram(
+    'study_guide_qa_pairs_per_second',
+    'Q&A pairs per second over a whole study guide run',
+    buckets=[0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0]
+)
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'response_cache_lookups_total',
+    'Semantic response cache lookups by outcome',
+    ['result']
+)
+
+RESPONSE_CACHE_SIMILARITY = Histogram(
+    'response_cache_best_similarity',
+    'Cosine similarity of the closest cached question on each lookup',
+    buckets=[0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.99, 1.0]
+)
+
+RESPONSE_CACHE_ENTRIES = Gauge(
+    'response_cache_entries',
+    'Answers currently stored in the semantic response cache'
+)
+
+LLM_WORKERS_ALIVE = Gauge(
+    'llm_workers_alive',
+    'LLM worker processes currently running'
+)
+
+LLM_WORKER_RESTARTS = Counter(
+    'llm_worker_restarts_total',
+    'LLM worker processes restarted after a crash or failed health check'
+)
+
+LLM_WORKER_IN_FLIGHT = Gauge(
+    'llm_worker_in_flight',
+    'Requests currently dispatched to each LLM worker',
+    ['worker']
+)
+
+BACKGROUND_JOBS = Counter(
+    'background_jobs_total',
+    'Background jobs finished, by kind and outcome',
+    ['kind', 'status']
+)
+
+BACKGROUND_QUEUE_LENGTH = Gauge(
+    'background_jobs_pending',
+    'Background jobs waiting to run',
+    ['kind']
+)
+
+BACKGROUND_JOB_DURATION = Histogram(
+    'background_job_duration_seconds',
+    'Wall time of one background job attempt, by kind',
+    ['kind'],
+    buckets=[0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0]
+)
+
+EMBEDDING_THROUGHPUT = Histogram(
+    'embedding_chunks_per_second',
+    'Bulk embedding throughput of one encode call',
+    ['mode'],
+    buckets=[1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+)
+
+SHARED_RESOURCE_MEMORY = Gauge(
+    'shared_resource_memory_bytes',
+    'Resident memory added by loading a process-wide shared resource',
+    ['resource']
+)
+
+SHARED_RESOURCES_LOADED = Gauge(
+    'shared_resources_loaded',
+    'Process-wide shared resources currently loaded'
+)
+
+QUERY_EMBED_BATCH_SIZE = Histogram(
+    'query_embedding_batch_size',
+    'Distinct queries encoded together in one micro-batch',
+    buckets=[1, 2, 4, 8, 16, 32, 64]
+)
+
+QUERY_EMBED_QUEUE_WAIT = Histogram(
+    'query_embedding_queue_wait_seconds',
+    'Time a query waited for its micro-batch to start encoding',
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0]
+)
+
+QUERY_EMBED_CACHE_LOOKUPS = Counter(
+    'query_embedding_cache_lookups_total',
+    'Query embedding LRU lookups',
+    ['result']
+)
+
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    'embedding_cache_lookups_total',
+    'Chunk embedding cache lookups, per chunk',
+    ['result']
+)
+
+ARTIFACT_LOOKUPS = Counter(
+    'document_artifact_lookups_total',
+    'Parsed-document artifact lookups by what was looked for (pages or chunks) and result',
+    ['kind', 'result']
+)
+
+EMBEDDING_CACHE_BYTES_SAVED = Counter(
+    'embedding_cache_bytes_saved_total',
+    'Chunk text bytes served from the embedding cache instead of being encoded'
+)
+
+EMBEDDING_CACHE_SIZE = Gauge(
+    'embedding_cache_size_bytes',
+    'Bytes of embeddings held in the chunk embedding cache'
+)
+
+CONTEXT_COMPACTION_TOKENS = Histogram(
+    'rag_context_tokens',
+    'Retrieved context tokens before and after overlap merging and budget trimming',
+    ['stage'],
+    buckets=[64, 128, 256, 512, 768, 1024, 1536, 2048, 4096]
+)
+
+VECTOR_SEARCH_LATENCY = Histogram(
+    'vector_search_seconds',
+    'Nearest-neighbour search time, excluding the query embedding',
+    ['backend'],
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1]
+)
+
 RETRIEVAL_LATENCY = Summary(
     'rag_retrieval_seconds', 
     'Time spent retrieving documents from Vector DB'
 )
 
+RETRIEVAL_BATCH_LATENCY = Summary(
+    'rag_retrieval_batch_seconds',
+    'Time spent retrieving documents for a whole batch of queries'
+)
+
+RETRIEVAL_BATCH_SIZE = Histogram(
+    'rag_retrieval_batch_size',
+    'Queries per batched retrieval call',
+    buckets=[1, 2, 5, 10, 20, 50, 100, 200]
+)
+
+INGEST_FIRST_BATCH_LATENCY = Histogram(
+    'rag_ingest_first_batch_seconds',
+    'Time from the start of streaming ingest until the first batch of chunks is searchable',
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+
+INGEST_STAGE_LATENCY = Histogram(
+    'rag_ingest_stage_seconds',
+    'Time one document spends in each ingest stage (extract, chunk, embed, index)',
+    ['stage'],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+)
+
 
 SIMILARITY_SCORE = Histogram(
     'rag_similarity_score', 
@@ -74,6 +311,52 @@ LARGE_FILES = Counter(
     'Number of uploaded files exceeding 10MB'
 )
 
+COMPONENT_READY = Gauge(
+    'app_component_ready',
+    'Whether a startup component has finished loading (1) or not yet (0)',
+    ['component']
+)
+
+_component_status = {}
+_component_status_lock = threading.Lock()
+
+def set_component_status(component, status):
+    """Record startup progress of a component: 'pending', 'loading', 'ready' or 'failed: ...'"""
+    with _component_status_lock: _component_status[component] = status
+    COMPONENT_READY.labels(component=component).set(1 if status == "ready" else 0)
+
+def get_readiness():
+    with _component_status_lock: status = dict(_component_status)
+    return bool(status) and all(s == "ready" for s in status.values()), status
+
+def add_stage_time(timings, stage, started):
+    """Add the time since perf_counter() value started to timings[stage]; no-op without a timings dict"""
+    if timings is not None: timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+def observe_stage_times(timings):
+    for stage, seconds in timings.items(): INGEST_STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+class HealthRequestHandler(BaseHTTPRequestHandler):
+    """/healthz answers as soon as the process is up, /readyz only once every component is loaded"""
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            code, body = 200, {"status": "ok"}
+        elif self.path == "/readyz":
+            ready, status = get_readiness()
+            code, body = (200 if ready else 503), {"ready": ready, "components": status}
+        else:
+            code, body = 404, {"error": "not found"}
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
 @st.cache_resource
 def start_metrics_server(port=8000):
     """
@@ -84,4 +367,14 @@ def start_metrics_server(port=8000):
         start_http_server(port)
         print(f"✅ Metrics server started on port {port}")
     except OSError:
-        print(f"⚠️ Metrics server already running on port {port}")
\ No newline at end of file
+        print(f"⚠️ Metrics server already running on port {port}")
+
+@st.cache_resource
+def start_health_server(port=8001):
+    """Starts the /healthz and /readyz endpoints next to the metrics server, once per process"""
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), HealthRequestHandler)
+        threading.Thread(target=server.serve_forever, name="health-server", daemon=True).start()
+        print(f"✅ Health server started on port {port}")
+    except OSError:
+        print(f"⚠️ Health server already running on port {port}")
@@ -0,0 +1,44 @@
+import os
+import threading
+from utils.monitoring import SHARED_RESOURCE_MEMORY, SHARED_RESOURCES_LOADED
+
+def rss_bytes():
+    """Resident set size of this process, or 0 where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+class ResourceRegistry:
+    """Owns the heavy objects of a process (Chroma client, embedding model, ...).
+
+    Each resource is built once, on first get(), under its own lock, so two
+    sessions asking at the same time wait for a single load instead of
+    loading twice. Sessions keep only handles that call get().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.load_locks = {}
+
+    def get(self, name, factory):
+        resource = self.resources.get(name)
+        if resource is not None: return resource
+        with self.lock:
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            if name not in self.resources:
+                # RSS growth while loading; approximate if other threads allocate meanwhile
+                before = rss_bytes()
+                self.resources[name] = factory()
+                SHARED_RESOURCE_MEMORY.labels(resource=name).set(max(0, rss_bytes() - before))
+                SHARED_RESOURCES_LOADED.set(len(self.resources))
+            return self.resources[name]
+
+    def loaded(self):
+        return list(self.resources)
+
+# One registry per process; Streamlit reruns the page script but keeps imported modules
+RESOURCES = ResourceRegistry()
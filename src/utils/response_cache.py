@@ -0,0 +1,124 @@
+import hashlib
+import json
+import sqlite3
+import time
+import numpy as np
+import streamlit as st
+import config
+from models.query_batcher import get_query_batcher
+from utils.database import DB_DIR
+from utils.monitoring import RESPONSE_CACHE_LOOKUPS, RESPONSE_CACHE_SIMILARITY, RESPONSE_CACHE_ENTRIES
+
+RESPONSE_CACHE_DB = DB_DIR / "response_cache.db"
+
+def _hash(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Semantic cache of generated answers.
+
+    An entry only matches when the retrieved context and generation params
+    are identical; within that set the question matches by embedding cosine
+    similarity, so rephrasings of the same question are served from cache.
+    """
+
+    def __init__(self, query_embedder=None, db_path=None):
+        self.query_embedder = query_embedder or get_query_batcher()
+        self.db_path = db_path or RESPONSE_CACHE_DB
+        self.init_database()
+
+    def init_database(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT,
+                context_hash TEXT NOT NULL,
+                params_hash TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_key ON response_cache (context_hash, params_hash)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_doc ON response_cache (document_id)')
+        conn.commit()
+        conn.close()
+
+    def make_key(self, context, params):
+        return _hash(context or ""), _hash(json.dumps(params, sort_keys=True))
+
+    def embed(self, prompt):
+        embedding = self.query_embedder.embed(prompt)
+        return embedding / max(np.linalg.norm(embedding), 1e-12)
+
+    def lookup(self, prompt, context, params):
+        """Return (cached response or None, prompt embedding to pass to store())"""
+        embedding = self.embed(prompt)
+        context_hash, params_hash = self.make_key(context, params)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, embedding, response FROM response_cache
+            WHERE context_hash = ? AND params_hash = ? AND created_at > ?
+        ''', (context_hash, params_hash, time.time() - config.RESPONSE_CACHE_TTL))
+        rows = cursor.fetchall()
+
+        best_id, best_response, best_score = None, None, -1.0
+        if rows:
+            matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+            scores = matrix @ embedding
+            i = int(np.argmax(scores))
+            best_id, best_response, best_score = rows[i][0], rows[i][2], float(scores[i])
+            RESPONSE_CACHE_SIMILARITY.observe(best_score)
+
+        if best_score >= config.RESPONSE_CACHE_THRESHOLD:
+            cursor.execute('UPDATE response_cache SET last_accessed = ?, hits = hits + 1 WHERE id = ?', (time.time(), best_id))
+            conn.commit()
+            conn.close()
+            RESPONSE_CACHE_LOOKUPS.labels(result="hit").inc()
+            return best_response, embedding
+
+        conn.close()
+        RESPONSE_CACHE_LOOKUPS.labels(result="miss").inc()
+        return None, embedding
+
+    def store(self, prompt, embedding, context, params, response, document_id=None):
+        context_hash, params_hash = self.make_key(context, params)
+        now = time.time()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO response_cache (document_id, context_hash, params_hash, prompt, embedding, response, created_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (document_id, context_hash, params_hash, prompt, embedding.astype(np.float32).tobytes(), response, now, now))
+        self._evict(cursor, now)
+        conn.commit()
+        conn.close()
+
+    def _evict(self, cursor, now):
+        """Drop expired entries, then the least recently used ones above the size limit"""
+        cursor.execute('DELETE FROM response_cache WHERE created_at <= ?', (now - config.RESPONSE_CACHE_TTL,))
+        cursor.execute('''
+            DELETE FROM response_cache WHERE id IN (
+                SELECT id FROM response_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+            )
+        ''', (config.RESPONSE_CACHE_MAX_ENTRIES,))
+        cursor.execute('SELECT COUNT(*) FROM response_cache')
+        RESPONSE_CACHE_ENTRIES.set(cursor.fetchone()[0])
+
+    def invalidate_document(self, document_id):
+        """Drop every answer for a document that is deleted; re-uploads keep them, since entries are keyed by content hash"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM response_cache WHERE document_id = ?', (document_id,))
+        conn.commit()
+        conn.close()
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    return ResponseCache()
@@ -0,0 +1,35 @@
+import threading
+import streamlit as st
+from models.embeddings import EmbeddingHandler
+from models.llm_handler import get_llm_handler
+from utils.database import init_databases
+from utils.monitoring import set_component_status
+
+def _load(component, load):
+    set_component_status(component, "loading")
+    try:
+        load()
+        set_component_status(component, "ready")
+    except Exception as e:
+        print(f"❌ Warm-up of {component} failed: {e}")
+        set_component_status(component, f"failed: {e}")
+
+def warm_up(llm_handler, embedding_handler):
+    """Load the models in the order requests need them: embeddings are small and used for retrieval"""
+    _load("embedding_model", lambda: embedding_handler.get_embeddings(["warm-up"]))
+    _load("llm", llm_handler.load_model)
+
+@st.cache_resource(show_spinner=False)
+def start_background_warmup():
+    """Prepare storage and start loading the models once per process, without blocking the login page"""
+    init_databases()
+    set_component_status("database", "ready")
+    set_component_status("embedding_model", "pending")
+    set_component_status("llm", "pending")
+
+    thread = threading.Thread(
+        target=warm_up, args=(get_llm_handler(), EmbeddingHandler()),
+        name="model-warmup", daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,148 @@
+import threading
+import time
+from itertools import islice
+import streamlit as st
+import config
+from models.llm_handler import get_llm_handler
+from models.scheduler import get_inference_scheduler, Priority
+from rag.document_processor import DocumentProcessor, document_hash, prefetch
+from rag.retriever import Retriever
+from utils.database import (
+    enqueue_job, claim_next_job, finish_job, requeue_running_jobs, count_jobs, update_chat_title,
+    update_job_progress, mark_document_indexed
+)
+from utils.monitoring import (
+    BACKGROUND_JOBS, BACKGROUND_QUEUE_LENGTH, BACKGROUND_JOB_DURATION, INDEX_SIZE, INDEX_FRESHNESS, DOCS_INDEXED
+)
+
+class TaskRunner:
+    """Runs jobs persisted in the background_jobs table on worker threads.
+
+    handlers maps a job kind to a function taking the job payload and the
+    job itself (id, attempts, and the progress saved by earlier attempts).
+    Jobs survive restarts: anything left 'running' by a dead process is
+    queued again when the runner starts.
+    """
+
+    def __init__(self, handlers, num_workers=1, max_attempts=None):
+        self.handlers = handlers
+        self.kinds = list(handlers)
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts or config.BACKGROUND_JOB_MAX_ATTEMPTS
+        self.wakeup = threading.Event()
+
+    def start(self):
+        for kind in requeue_running_jobs(self.kinds, self.max_attempts):
+            BACKGROUND_JOBS.labels(kind=kind, status="failed").inc()
+        for i in range(self.num_workers):
+            threading.Thread(target=self._worker, name=f"task-runner-{i}", daemon=True).start()
+        self.wakeup.set()
+
+    def submit(self, kind, payload, dedup_key=None):
+        enqueue_job(kind, payload, dedup_key)
+        self._update_queue_length()
+        self.wakeup.set()
+
+    def _update_queue_length(self):
+        for kind in self.kinds:
+            BACKGROUND_QUEUE_LENGTH.labels(kind=kind).set(count_jobs([kind], "pending"))
+
+    def _worker(self):
+        while True:
+            job = claim_next_job(self.kinds)
+            if job is None:
+                self.wakeup.wait(config.BACKGROUND_POLL_INTERVAL)
+                self.wakeup.clear()
+                continue
+            self._update_queue_length()
+            self._run(job)
+
+    def _run(self, job):
+        start = time.time()
+        try:
+            result = self.handlers[job['kind']](job['payload'], job)
+            finish_job(job['id'], "done", result=result)
+            BACKGROUND_JOBS.labels(kind=job['kind'], status="done").inc()
+        except Exception as e:
+            print(f"⚠️ Background job {job['kind']}#{job['id']} failed: {e}")
+            retry = job['attempts'] < self.max_attempts
+            finish_job(job['id'], "pending" if retry else "failed", error=str(e))
+            BACKGROUND_JOBS.labels(kind=job['kind'], status="retried" if retry else "failed").inc()
+        finally:
+            BACKGROUND_JOB_DURATION.labels(kind=job['kind']).observe(time.time() - start)
+
+def clean_title(text):
+    return text.replace('"', '').replace("Title:", "").strip()
+
+def make_chat_title_handler(llm_handler, scheduler):
+    def generate_chat_title(payload, job):
+        prompt = f"Generate a 3-word title for: '{payload['text']}'"
+        title = clean_title(scheduler.run(
+            llm_handler.generate_response, prompt, max_new_tokens=20, priority=Priority.BACKGROUND
+        ))
+        if title: update_chat_title(payload['chat_id'], title)
+        return title
+    return generate_chat_title
+
+def ingest_job_key(user_id, doc_hash):
+    return f"ingest:{user_id}:{doc_hash}"
+
+def ingest_document(payload, job):
+    """Extract, chunk, embed and index one saved PDF, checkpointing after every stored batch.
+
+    A retried or restarted job skips the chunks its checkpoint counts as
+    stored: pages are read again, but nothing is embedded twice. A document
+    parsed before (by anyone) is read from the artifact store, not the PDF.
+    The saved file must still hash to doc_hash, or the job fails before
+    anything is indexed or cached under that hash.
+    """
+    if document_hash(payload['path']) != payload['doc_hash']:
+        raise ValueError(f"{payload['path']} no longer matches document {payload['doc_hash'][:12]}")
+    processor = DocumentProcessor()
+    retriever = Retriever()
+    retriever.open_document(payload['user_id'], payload['doc_hash'])
+    done = job['progress'].get('chunks', 0)
+    progress = {
+        'stage': 'indexing', 'pages': processor.count_pages(payload['path'], payload['doc_hash']),
+        'page': job['progress'].get('page', 0), 'chunks': done, 'seconds': {}
+    }
+    update_job_progress(job['id'], progress)
+    timings = {}
+
+    def checkpoint(n_chunks, metadata):
+        progress.update(
+            chunks=done + n_chunks, page=metadata.get('page_end', progress['page']),
+            seconds={stage: round(seconds, 2) for stage, seconds in timings.items()}
+        )
+        update_job_progress(job['id'], progress)
+
+    chunk_stream = prefetch(processor.stream_chunks(payload['path'], timings=timings, doc_hash=payload['doc_hash']), config.INGEST_PREFETCH_CHUNKS)
+    _, n_chars = retriever.index_stream(islice(chunk_stream, done, None), timings=timings, on_batch=checkpoint)
+
+    n_chunks = retriever.vector_store.collection.count()
+    mark_document_indexed(payload['user_id'], payload['doc_hash'], payload['file_name'], n_chunks)
+    DOCS_INDEXED.inc(); INDEX_FRESHNESS.set_to_current_time(); INDEX_SIZE.inc(n_chars)
+    progress.update(stage='done', page=progress['pages'], chunks=n_chunks)
+    update_job_progress(job['id'], progress)
+
+    # Queued directly so ingestion never waits for the LLM to load; the title runner picks it up
+    first_chunk = retriever.vector_store.first_chunk()
+    if first_chunk and payload.get('chat_id'):
+        enqueue_job("chat_title", {'chat_id': payload['chat_id'], 'text': first_chunk[:200]}, dedup_key=f"chat_title:{payload['chat_id']}")
+    return {'chunks': n_chunks}
+
+@st.cache_resource(show_spinner=False)
+def get_task_runner():
+    """Runner for non-interactive LLM work; it only ever uses the model when nothing else is waiting"""
+    runner = TaskRunner({
+        "chat_title": make_chat_title_handler(get_llm_handler(), get_inference_scheduler()),
+    })
+    runner.start()
+    return runner
+
+@st.cache_resource(show_spinner=False)
+def get_ingest_runner():
+    """Runner for document ingestion, apart from the LLM jobs so uploads never queue behind titles"""
+    runner = TaskRunner({"ingest": ingest_document}, num_workers=config.INGEST_WORKERS)
+    runner.start()
+    return runner